@@ -1,5 +1,35 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_migrate
+
+
+def clear_caches(plan=None, **kwargs):
+    # Кэш общий и переживает перезапуск: после применённых миграций
+    # (и `flush`) закэшированные объекты и фрагменты могут не совпадать
+    # с базой. `migrate`, которому нечего применять, кэш не трогает.
+    if plan == []:
+        return
+    # обёртки (TieredCache, StampedeCache) очищают и кэш под собой,
+    # поэтому каждое хранилище очищается один раз
+    wrapped = {options.get('LOCATION') for options in settings.CACHES.values()}
+    for alias in settings.CACHES:
+        if alias not in wrapped:
+            caches[alias].clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        from . import querycache
+
+        querycache.install()
+        post_migrate.connect(
+            clear_caches, sender=self, dispatch_uid='core_clear_caches'
+        )
+        # манифест статики читается один раз при запуске, а не на
+        # первом запросе, который выведет `{% static %}`
+        staticfiles_storage.hashed_names
@@ -0,0 +1,717 @@
+"""
+Бэкенды кэша.
+
+`SQLiteCache` хранит кэш в файле SQLite, общем для всех процессов на
+машине: истёкший фрагмент пересчитывает один воркер, а не каждый со
+своим LocMemCache. Файл открыт в режиме WAL, поэтому чтение не ждёт
+записи, а `add` и `incr` атомарны между процессами. На нескольких
+машинах вместо него подключается memcached: остальной код от бэкенда
+не зависит.
+
+`StampedeCache` оборачивает другой кэш (LOCATION — его псевдоним
+в CACHES) и не даёт горячему ключу вызвать лавину пересчётов:
+
+* вероятностное раннее истечение (XFetch): до срока запрос считает
+  значение истёкшим с вероятностью, которая растёт к сроку и тем
+  больше, чем дольше значение пересчитывалось, поэтому обычно один
+  запрос обновляет его заранее;
+* единственный пересчёт: промах получает только запрос, взявший
+  блокировку ключа. Остальные ещё `STALE_TIMEOUT` секунд после срока
+  получают прежнее значение, а если его нет — ждут нового до
+  `LOCK_WAIT` секунд.
+
+Обёртка рассчитана на схему «get, при промахе посчитать и set», как
+у `{% cache %}` и `get_or_set`.
+
+`TieredCache` ставит перед общим кэшем (L2, LOCATION — его псевдоним)
+ограниченный LRU в памяти процесса (L1): повторное чтение ключа не
+идёт к L2. Удаление, `incr` и запись ключа с префиксом из
+`BROADCAST_PREFIXES` (версии пространств имён) публикуют в L2
+сообщение об инвалидации с номером поколения. Процессы раз в
+`SYNC_INTERVAL` секунд сверяют поколение и выбрасывают из L1
+изменённые ключи, а если сообщения потеряны — весь L1. Так правки
+постов, групп, комментариев и подписок (сигналы меняют версии
+фрагментов и сбрасывают счётчики) видны во всех воркерах не позже
+чем через `SYNC_INTERVAL`. Остальные записи — заполнение кэша после
+промаха по ключам, в которые уже входят версии, — не рассылаются:
+иначе обычное чтение страниц выталкивало бы процессы за
+`MAX_EVENTS` и очищало их L1. Значение, прочитанное из L2, живёт
+в L1 не дольше `LOCAL_TIMEOUT`. Попадания и промахи по уровням
+каждый процесс передаёт в L2 раз в `STATS_INTERVAL` секунд, чтобы
+не писать в общий кэш на каждой сверке: сумму со всех процессов
+показывает `manage.py cache_stats`.
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+BUSY_TIMEOUT = 5  # сколько ждать освобождения файла другим процессом, с
+CULL_EVERY = 100  # как часто (раз в столько записей) чистить кэш
+
+BETA = 1.0  # больше — раньше и чаще ранние пересчёты
+LOCK_TIMEOUT = 30  # время жизни блокировки пересчёта, секунды
+LOCK_WAIT = 3  # сколько ждать чужого пересчёта, если нечего отдать, с
+POLL_INTERVAL = 0.05  # как часто проверять, готово ли значение, секунды
+STALE_TIMEOUT = 60  # сколько отдавать истёкшее значение, секунды
+
+LOCAL_TIMEOUT = 10  # сколько значение из L2 живёт в памяти процесса, с
+SYNC_INTERVAL = 1  # как часто сверять поколение инвалидаций, секунды
+EVENT_TIMEOUT = 60 * 5  # сколько хранятся сообщения об инвалидации, с
+MAX_EVENTS = 100  # отставший больше процесс очищает L1 целиком
+STATS_INTERVAL = 60  # как часто передавать счётчики попаданий в L2, с
+GENERATION_KEY = 'tier:generation'
+# запись этих ключей меняет значение, а не заполняет кэш после промаха
+BROADCAST_PREFIXES = ('fragment_version:',)
+STATS = ('l1_hits', 'l2_hits', 'misses')
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._connection = None
+        self._pid = None
+        self._writes = 0
+        # Оценка числа строк: растёт с каждой записью этого процесса
+        # (и при перезаписи ключа), точно строки считаются, только
+        # когда оценка превысила MAX_ENTRIES.
+        self._estimate = 0
+
+    def _db(self):
+        # Экземпляры бэкенда у каждого потока свои; после fork
+        # соединение родителя использовать нельзя.
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL'
+                ') WITHOUT ROWID'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._estimate = connection.execute(
+                'SELECT count(*) FROM cache'
+            ).fetchone()[0]
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        # IMMEDIATE: блокировка на запись берётся сразу, и между чтением
+        # и записью значение не изменит другой процесс
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _row(self, key, value, timeout):
+        return (
+            key,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout),
+        )
+
+    def _written(self, rows=1):
+        self._writes += 1
+        self._estimate += rows
+        if self._writes % CULL_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        db = self._db()
+        expired = db.execute(
+            'DELETE FROM cache WHERE expires <= ?', [time.time()]
+        ).rowcount
+        self._estimate = max(self._estimate - expired, 0)
+        if self._estimate <= self._max_entries:
+            return
+        # Оценка не видит записей других процессов и завышена
+        # перезаписями, поэтому перед вытеснением строки считаются.
+        count = db.execute('SELECT count(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # первыми вытесняются значения, которые истекут раньше всех
+            count -= db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                [max(count // self._cull_frequency, 1)],
+            ).rowcount
+        self._estimate = count
+
+    def get(self, key, default=None, version=None):
+        row = self._db().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._key(key, version), time.time()],
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._db().execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(keys))
+            ),
+            [*keys, time.time()],
+        )
+        return {keys[key]: pickle.loads(value) for key, value in rows}
+
+    def has_key(self, key, version=None):
+        return self._db().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._key(key, version), time.time()],
+        ).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._db().execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            self._row(self._key(key, version), value, timeout),
+        )
+        self._written()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                [
+                    self._row(self._key(key, version), value, timeout)
+                    for key, value in data.items()
+                ],
+            )
+        self._written(len(data))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # истёкшая запись, ещё не удалённая из файла, считается отсутствующей
+        cursor = self._db().execute(
+            'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) '
+            'DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            [*self._row(self._key(key, version), value, timeout), time.time()],
+        )
+        self._written(cursor.rowcount)
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [
+                self.get_backend_timeout(timeout),
+                self._key(key, version),
+                time.time(),
+            ],
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                [key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key],
+            )
+        return value
+
+    def delete(self, key, version=None):
+        cursor = self._db().execute(
+            'DELETE FROM cache WHERE key = ?', [self._key(key, version)]
+        )
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys],
+            )
+
+    def clear(self):
+        self._db().execute('DELETE FROM cache')
+        self._estimate = 0
+
+
+class StampedeCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._alias = location
+        self.beta = options.get('BETA', BETA)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', LOCK_TIMEOUT)
+        self.lock_wait = options.get('LOCK_WAIT', LOCK_WAIT)
+        self.stale_timeout = options.get('STALE_TIMEOUT', STALE_TIMEOUT)
+        # (ключ, версия) -> (токен, начало пересчёта) для блокировок,
+        # взятых этим экземпляром
+        self._held = {}
+
+    @cached_property
+    def _cache(self):
+        return caches[self._alias]
+
+    def _lock_key(self, key):
+        return f'stampede_lock:{key}'
+
+    def _acquire(self, key, version):
+        held = self._held.get((key, version))
+        if held is not None:
+            if time.monotonic() - held[1] < self.lock_timeout:
+                # пересчёт этого ключа уже за нами
+                return True
+            del self._held[(key, version)]
+        token = uuid.uuid4().hex
+        if self._cache.add(
+            self._lock_key(key), token, self.lock_timeout, version=version
+        ):
+            self._held[(key, version)] = (token, time.monotonic())
+            return True
+        return False
+
+    def _release(self, key, version):
+        held = self._held.pop((key, version), None)
+        if held is None:
+            return
+        token, _ = held
+        lock_key = self._lock_key(key)
+        if self._cache.get(lock_key, version=version) == token:
+            self._cache.delete(lock_key, version=version)
+
+    def _recompute_time(self, key, version):
+        held = self._held.get((key, version))
+        if held is None:
+            return 0.0
+        return min(time.monotonic() - held[1], self.lock_timeout)
+
+    def _expiring(self, expires, delta):
+        # XFetch: -log(u) при равномерном u из (0, 1] — экспонента
+        # со средним 1, поэтому пересчёт в среднем начинается
+        # за delta * beta до срока
+        jitter = -delta * self.beta * math.log(1 - random.random())
+        return time.time() + jitter >= expires
+
+    def _entry(self, key, value, timeout, version):
+        """Запись в кэше и время её хранения (с запасом на отдачу)."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        delta = self._recompute_time(key, version)
+        if timeout is None:
+            return (value, None, delta), None
+        stored = timeout + self.stale_timeout if timeout > 0 else timeout
+        return (value, time.time() + timeout, delta), stored
+
+    def _wait(self, key, default, version):
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = self._cache.get(key, version=version)
+            if entry is not None:
+                return entry[0]
+            if self._acquire(key, version):
+                # пересчитывавший запрос не справился, пересчёт за нами
+                return default
+        # ждать дольше нельзя: пересчитываем сами, без блокировки
+        return default
+
+    def get(self, key, default=None, version=None):
+        entry = self._cache.get(key, version=version)
+        if entry is None:
+            if self._acquire(key, version):
+                return default
+            return self._wait(key, default, version)
+        value, expires, delta = entry
+        if expires is None or not self._expiring(expires, delta):
+            return value
+        if self._acquire(key, version):
+            return default
+        # значение уже пересчитывают: пока отдаём прежнее
+        return value
+
+    def get_many(self, keys, version=None):
+        return {
+            key: entry[0]
+            for key, entry in self._cache.get_many(
+                keys, version=version
+            ).items()
+        }
+
+    def has_key(self, key, version=None):
+        return self._cache.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        entry, stored = self._entry(key, value, timeout, version)
+        self._cache.set(key, entry, stored, version=version)
+        self._release(key, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        entries = {}
+        stored = None
+        for key, value in data.items():
+            entry, stored = self._entry(key, value, timeout, version)
+            entries[key] = entry
+        failed = self._cache.set_many(entries, stored, version=version)
+        for key in data:
+            self._release(key, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if (key, version) in self._held:
+            # get отдал промах этому экземпляру, ему и записывать
+            self.set(key, value, timeout, version)
+            return True
+        entry, stored = self._entry(key, value, timeout, version)
+        return self._cache.add(key, entry, stored, version=version)
+
+    def delete(self, key, version=None):
+        return self._cache.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self._cache.delete_many(keys, version=version)
+
+    def clear(self):
+        self._held.clear()
+        self._cache.clear()
+
+
+def event_key(generation):
+    return f'tier:event:{generation}'
+
+
+def stat_key(name):
+    return f'tier:stats:{name}'
+
+
+class _Tier:
+    """L1 одного процесса: общий для всех потоков, в отличие от бэкендов."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # ключ -> (pickle значения, срок)
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        # отличает свои сообщения об инвалидации от чужих
+        self.origin = uuid.uuid4().hex
+        self.generation = None
+        self.synced = None
+        self.published = time.monotonic()
+        self.stats = Counter()
+
+    def get(self, key, missing):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return missing
+            if entry[1] <= time.monotonic():
+                del self.entries[key]
+                return missing
+            self.entries.move_to_end(key)
+        return pickle.loads(entry[0])
+
+    def remember(self, key, value, timeout):
+        if timeout <= 0:
+            self.forget([key])
+            return
+        entry = (
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            time.monotonic() + timeout,
+        )
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def forget(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def count(self, name, number=1):
+        with self.lock:
+            self.stats[name] += number
+
+    def take_stats(self):
+        with self.lock:
+            stats, self.stats = self.stats, Counter()
+        return stats
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def _tier(location, max_entries):
+    # после fork у дочернего процесса должен быть свой L1
+    key = (location, os.getpid())
+    with _tiers_lock:
+        if key not in _tiers:
+            _tiers[key] = _Tier(max_entries)
+        return _tiers[key]
+
+
+@receiver(setting_changed)
+def reset_tiers(setting, **kwargs):
+    # override_settings(CACHES=...) в тестах подменяет и L2
+    if setting == 'CACHES':
+        with _tiers_lock:
+            _tiers.clear()
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._alias = location
+        self.local_timeout = options.get('LOCAL_TIMEOUT', LOCAL_TIMEOUT)
+        self.sync_interval = options.get('SYNC_INTERVAL', SYNC_INTERVAL)
+        self.stats_interval = options.get('STATS_INTERVAL', STATS_INTERVAL)
+        self.broadcast_prefixes = tuple(
+            options.get('BROADCAST_PREFIXES', BROADCAST_PREFIXES)
+        )
+        self._tier = _tier(location, self._max_entries)
+        self._missing = object()
+
+    @cached_property
+    def _shared(self):
+        return caches[self._alias]
+
+    def _local_key(self, key, version):
+        return self.make_key(key, version=version)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _changes(self, key):
+        return key.startswith(self.broadcast_prefixes)
+
+    def _broadcast(self, keys):
+        """Сообщить остальным процессам, что ключи `keys` изменились."""
+        shared = self._shared
+        shared.add(GENERATION_KEY, time.time_ns(), None)
+        try:
+            generation = shared.incr(GENERATION_KEY)
+        except ValueError:
+            # L2 очистили между add и incr: остальные очистят L1 сами
+            return
+        shared.set(
+            event_key(generation), (self._tier.origin, keys), EVENT_TIMEOUT
+        )
+
+    def _sync(self):
+        tier = self._tier
+        now = time.monotonic()
+        if tier.synced is not None and now - tier.synced < self.sync_interval:
+            return
+        if not tier.sync_lock.acquire(blocking=False):
+            # сверяется другой поток
+            return
+        try:
+            tier.synced = now
+            self._apply_events()
+            if now - tier.published >= self.stats_interval:
+                tier.published = now
+                self._publish_stats()
+        finally:
+            tier.sync_lock.release()
+
+    def _apply_events(self):
+        tier = self._tier
+        seen = tier.generation
+        generation = self._shared.get(GENERATION_KEY)
+        if generation == seen:
+            return
+        tier.generation = generation
+        if seen is None or generation is None:
+            # поколение заведено или L2 очищен: что менялось, неизвестно
+            tier.clear()
+            return
+        lag = generation - seen
+        if not 0 < lag <= MAX_EVENTS:
+            tier.clear()
+            return
+        events = self._shared.get_many(
+            [event_key(number) for number in range(seen + 1, generation + 1)]
+        )
+        if len(events) < lag:
+            tier.clear()
+            return
+        for origin, keys in events.values():
+            if origin != tier.origin:
+                tier.forget(keys)
+
+    def _publish_stats(self):
+        for name, number in self._tier.take_stats().items():
+            self._shared.add(stat_key(name), 0, None)
+            try:
+                self._shared.incr(stat_key(name), number)
+            except ValueError:
+                pass
+
+    def stats(self):
+        """Попадания и промахи по уровням, собранные со всех процессов."""
+        self._publish_stats()
+        stored = self._shared.get_many([stat_key(name) for name in STATS])
+        return {name: stored.get(stat_key(name), 0) for name in STATS}
+
+    def reset_stats(self):
+        self._tier.take_stats()
+        self._shared.delete_many([stat_key(name) for name in STATS])
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self._local_key(key, version)
+        value = self._tier.get(local_key, self._missing)
+        if value is not self._missing:
+            self._tier.count('l1_hits')
+            return value
+        value = self._shared.get(key, self._missing, version=version)
+        if value is self._missing:
+            self._tier.count('misses')
+            return default
+        self._tier.count('l2_hits')
+        self._tier.remember(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._tier.get(
+                self._local_key(key, version), self._missing
+            )
+            if value is self._missing:
+                remote.append(key)
+            else:
+                found[key] = value
+        fetched = (
+            self._shared.get_many(remote, version=version) if remote else {}
+        )
+        for key, value in fetched.items():
+            self._tier.remember(
+                self._local_key(key, version), value, self.local_timeout
+            )
+        self._tier.count('l1_hits', len(found))
+        self._tier.count('l2_hits', len(fetched))
+        self._tier.count('misses', len(remote) - len(fetched))
+        found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if self._tier.get(local_key, self._missing) is not self._missing:
+            return True
+        return self._shared.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared.set(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        self._tier.remember(local_key, value, self._local_timeout(timeout))
+        if self._changes(key):
+            self._broadcast([local_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._shared.set_many(data, timeout, version=version)
+        changed = []
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            if self._changes(key):
+                changed.append(local_key)
+            if key not in failed:
+                self._tier.remember(
+                    local_key, value, self._local_timeout(timeout)
+                )
+        if changed:
+            self._broadcast(changed)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Ключа в L2 не было, значит и в чужих L1 его нет: рассылать
+        # нечего.
+        if not self._shared.add(key, value, timeout, version=version):
+            return False
+        self._tier.remember(
+            self._local_key(key, version), value, self._local_timeout(timeout)
+        )
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        value = self._shared.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        self._tier.remember(local_key, value, self.local_timeout)
+        self._broadcast([local_key])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        self._tier.forget([local_key])
+        deleted = self._shared.delete(key, version=version)
+        self._broadcast([local_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        local_keys = [self._local_key(key, version) for key in keys]
+        self._tier.forget(local_keys)
+        self._shared.delete_many(keys, version=version)
+        self._broadcast(local_keys)
+
+    def clear(self):
+        self._tier.clear()
+        self._shared.clear()
+        # Новое поколение несравнимо с прежними: остальные процессы
+        # при сверке очистят свои L1 целиком.
+        generation = time.time_ns()
+        self._shared.set(GENERATION_KEY, generation, None)
+        self._tier.generation = generation
@@ -0,0 +1,8 @@
+from core.fragments import FRAGMENT_TIMEOUT
+
+
+def fragments(request):
+    """Добавляет время жизни кэшированных фрагментов страниц."""
+    return {
+        'fragment_timeout': FRAGMENT_TIMEOUT
+    }
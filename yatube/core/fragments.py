@@ -0,0 +1,58 @@
+"""
+Поколения (версии) пространств имён для кэширования фрагментов.
+
+Версия пространства имён входит в ключ `{% cache %}`: при изменении
+данных версия меняется, старые фрагменты перестают находиться и
+вытесняются сами, поэтому время жизни фрагментов можно делать большим.
+Версия — момент её смены в наносекундах, а не счётчик: если ключ
+версии вытеснен из кэша, новая версия не совпадёт ни с одной из
+прежних. Поэтому по версиям можно строить и валидаторы условных
+GET-запросов (ETag и Last-Modified).
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24  # время жизни фрагментов, секунды
+
+
+def version_key(namespace):
+    return f'fragment_version:{namespace}'
+
+
+def _new_version():
+    return format(time.time_ns(), 'x')
+
+
+def versions(*namespaces):
+    """Версии пространств имён в порядке перечисления."""
+    keys = [version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            new = _new_version()
+            # версию мог одновременно завести другой процесс
+            if not cache.add(key, new, None):
+                new = cache.get(key, new)
+            found[key] = new
+    return [str(found[key]) for key in keys]
+
+
+def version(*namespaces):
+    """Общая версия для фрагментов, зависящих от нескольких пространств."""
+    return '.'.join(versions(*namespaces))
+
+
+def changed_at(*versions):
+    """Момент последней смены среди переданных версий."""
+    latest = max(int(value, 16) for value in versions)
+    return datetime.fromtimestamp(latest / 10 ** 9, tz=timezone.utc)
+
+
+def bump(*namespaces):
+    """Сменить версию пространств имён, сделав их фрагменты устаревшими."""
+    cache.set_many(
+        {version_key(namespace): _new_version() for namespace in namespaces},
+        None
+    )
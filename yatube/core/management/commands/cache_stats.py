@@ -0,0 +1,51 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import TieredCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает долю попаданий в память процесса (L1) и в общий '
+        'кэш (L2), собранную со всех процессов с момента сброса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cache',
+            default='default',
+            help='Псевдоним двухуровневого кэша в CACHES.'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить статистику после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        cache = caches[options['cache']]
+        if not isinstance(cache, TieredCache):
+            raise CommandError(
+                f'Кэш {options["cache"]} не двухуровневый (TieredCache).'
+            )
+        stats = cache.stats()
+        total = sum(stats.values())
+        shared = stats['l2_hits'] + stats['misses']
+        self.stdout.write(f'Обращений: {total}')
+        self.stdout.write(
+            f'L1 (память процесса): попаданий {stats["l1_hits"]} '
+            f'({self.percent(stats["l1_hits"], total):.1f}%)'
+        )
+        self.stdout.write(
+            f'L2 (общий кэш): попаданий {stats["l2_hits"]} из {shared} '
+            f'({self.percent(stats["l2_hits"], shared):.1f}%)'
+        )
+        self.stdout.write(
+            f'Итого попаданий: '
+            f'{self.percent(total - stats["misses"], total):.1f}%'
+        )
+        if options['reset']:
+            cache.reset_stats()
+
+    def percent(self, part, whole):
+        return part * 100 / whole if whole else 0.0
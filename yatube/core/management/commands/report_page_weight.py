@@ -0,0 +1,71 @@
+import html
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько байт получает браузер для страницы: сам '
+        'HTML и подключённые статика и картинки (атрибуты src и href), '
+        'с учётом сжатия и кэширования. Файлы запрашиваются у самого '
+        'сайта, как это сделал бы браузер.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls',
+            nargs='*',
+            default=['/'],
+            help='Адреса страниц.'
+        )
+        parser.add_argument(
+            '--accept-encoding',
+            default='br, gzip',
+            help='Заголовок Accept-Encoding запросов.'
+        )
+
+    def handle(self, *args, **options):
+        prefixes = '|'.join(
+            re.escape(prefix)
+            for prefix in (settings.STATIC_URL, settings.MEDIA_URL)
+        )
+        self.asset = re.compile(rf'(?:src|href)="((?:{prefixes})[^"]+)"')
+        client = Client(HTTP_ACCEPT_ENCODING=options['accept_encoding'])
+        for url in options['urls']:
+            self.report(client, url)
+
+    def size(self, response):
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
+
+    def report(self, client, url):
+        response = client.get(url)
+        page = response.content.decode()
+        rows = [(url, response.status_code, self.size(response), '', '')]
+        for asset in dict.fromkeys(self.asset.findall(page)):
+            asset = html.unescape(asset)
+            response = client.get(asset)
+            rows.append((
+                asset,
+                response.status_code,
+                self.size(response),
+                response.get('Content-Encoding', ''),
+                'immutable' if 'immutable' in response.get(
+                    'Cache-Control', ''
+                ) else '',
+            ))
+        self.stdout.write(
+            f'{"байт":>9} {"код":>4} {"сжатие":>7} {"кэш":>9}  адрес'
+        )
+        for address, status, size, encoding, cache in rows:
+            self.stdout.write(
+                f'{size:>9} {status:>4} {encoding:>7} {cache:>9}  {address}'
+            )
+        self.stdout.write(
+            f'Всего для {url}: {sum(row[2] for row in rows)} байт, '
+            f'файлов: {len(rows)}'
+        )
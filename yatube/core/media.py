@@ -0,0 +1,186 @@
+"""
+Отдача медиафайлов.
+
+Python только проверяет путь и выставляет заголовки, а сами байты
+отправляет веб-сервер или ядро:
+
+* `settings.MEDIA_SENDFILE = 'x-accel-redirect'` — ответ с заголовком
+  X-Accel-Redirect, файл отдаёт nginx из внутреннего location
+  `settings.MEDIA_ACCEL_PREFIX`, который смотрит в MEDIA_ROOT;
+* `'x-sendfile'` — заголовок X-Sendfile с путём к файлу (Apache
+  mod_xsendfile, lighttpd);
+* `None` — файл отдаётся через `wsgi.file_wrapper`: gunicorn
+  отправляет его в сокет через `os.sendfile` без копирования
+  в Python, начиная с текущей позиции файла и не дальше
+  Content-Length, поэтому так же отдаются и диапазоны.
+
+Запросы с Range (один диапазон байт) получают 206, условные запросы
+по ETag и Last-Modified — 304. Файлы с именем из хэша содержимого
+(`core.storage`, миниатюры sorl-thumbnail) никогда не меняются: их ETag —
+сам хэш, и они кэшируются браузером на год с `immutable`.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# имя из хэша содержимого: ab/abcdef….jpg или ab/cd/abcdef….jpg
+HASHED_NAME = re.compile(
+    r'(?:^|/)(?:[0-9a-f]{2}/){1,2}([0-9a-f]{32,})\.\w+$'
+)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365  # кэш неизменяемых файлов, секунды
+MAX_AGE = 60 * 60  # кэш остальных файлов, секунды
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class _RangeFile:
+    """
+    Файл, из которого читается не больше `length` байт. `fileno`
+    остаётся у файла: sendfile отправляет его с текущей позиции,
+    а длину берёт из Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Диапазон (начало, конец включительно) из заголовка Range или None,
+    если заголовок надо проигнорировать и отдать файл целиком
+    (например, запрошено несколько диапазонов).
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        # последние `last` байт
+        start, end = max(size - int(last), 0), size - 1
+        if not int(last):
+            raise RangeNotSatisfiable
+    else:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _validators(name, stat_result):
+    hashed = HASHED_NAME.search(name)
+    if hashed:
+        etag = f'"{hashed.group(1)}"'
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        etag = '"{:x}-{:x}"'.format(
+            stat_result.st_mtime_ns, stat_result.st_size
+        )
+        cache_control = f'public, max-age={MAX_AGE}'
+    return etag, cache_control
+
+
+def _offloaded(name, path):
+    # тело и диапазоны отдаст веб-сервер
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + name
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def file_response(request, path, size, etag, last_modified):
+    """
+    Ответ с телом файла: целиком или диапазоном из заголовка Range
+    (с учётом If-Range), 416 для недостижимого диапазона.
+    """
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (
+        if_range is None or if_range == etag
+        or parse_http_date_safe(if_range) == int(last_modified)
+    ):
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+        response['Content-Length'] = size
+        return response
+    start, end = byte_range
+    file.seek(start)
+    response = FileResponse(_RangeFile(file, end - start + 1), status=206)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def serve(request, path):
+    """Отдать файл из MEDIA_ROOT."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Файл не найден')
+    name = path.replace(os.sep, '/')
+    etag, cache_control = _validators(name, stat_result)
+    last_modified = stat_result.st_mtime
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = _offloaded(name, full_path)
+        else:
+            response = file_response(
+                request, full_path, stat_result.st_size, etag, last_modified
+            )
+        if response.status_code != 416:
+            content_type, encoding = mimetypes.guess_type(full_path)
+            response['Content-Type'] = (
+                content_type or 'application/octet-stream'
+            )
+            if encoding:
+                response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,139 @@
+"""
+Кэш целых страниц для анонимных посетителей.
+
+Представление помечает ответ суррогатными ключами (`tag`) — именами
+данных, из которых собрана страница. `PageCacheMiddleware` хранит
+такие ответы вместе с версиями ключей (пространства имён
+`core.fragments`), и, пока версии не сменились, следующий анонимный
+запрос той же страницы отдаётся из кэша: до сессий, пользователя,
+базы и шаблонов он не доходит. `purge` меняет версии после коммита
+транзакции, так что записанная раньше страница больше не находится.
+
+Анонимный — запрос без cookie сессии и сообщений: только такие
+страницы у всех посетителей одинаковые. В ключ страницы входят
+только параметры из `settings.PAGE_CACHE_PARAMETERS`: произвольные
+параметры в адресе не заводят новых записей и не вытесняют нужные.
+Ответы с cookie, с `Cache-Control: private` и без ключей не
+кэшируются.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+
+from . import fragments, querycache
+
+HEADER = 'Surrogate-Key'
+TIMEOUT = fragments.FRAGMENT_TIMEOUT  # записи с версиями можно хранить долго
+
+
+def namespace(key):
+    return f'surrogate:{key}'
+
+
+def tag(response, keys):
+    """Пометить ответ суррогатными ключами и вернуть его."""
+    keys = [*response.get(HEADER, '').split(), *map(str, keys)]
+    response[HEADER] = ' '.join(dict.fromkeys(keys))
+    return response
+
+
+def purge(*keys):
+    """Сбросить страницы с любым из ключей после коммита транзакции."""
+    if keys:
+        transaction.on_commit(
+            partial(fragments.bump, *map(namespace, keys))
+        )
+
+
+def page_key(request):
+    # порядок параметров с разными именами не важен, одноимённых — важен
+    params = sorted(
+        (
+            (name, values) for name, values in request.GET.lists()
+            if name in settings.PAGE_CACHE_PARAMETERS
+        ),
+        key=lambda item: item[0],
+    )
+    url = '{}://{}{}?{}'.format(
+        request.scheme, request.get_host(), request.path,
+        urlencode(params, doseq=True),
+    )
+    return 'page:' + hashlib.md5(url.encode()).hexdigest()
+
+
+def is_cacheable(request):
+    # Пока транзакция не закоммичена, её записи видны только ей:
+    # ни брать страницу из кэша, ни класть в него нельзя.
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+        and not querycache.uncommitted()
+    )
+
+
+def _restore(request, entry):
+    keys, versions, headers, content = entry
+    if fragments.versions(*map(namespace, keys)) != versions:
+        return None
+    response = HttpResponse(content)
+    for header, value in headers:
+        response[header] = value
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    )
+
+
+def _store(key, response, started):
+    keys = response.get(HEADER, '').split()
+    cache_control = response.get('Cache-Control', '')
+    if (
+        not keys
+        or response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or 'private' in cache_control
+        or 'no-store' in cache_control
+        or querycache.uncommitted()
+    ):
+        return
+    versions = fragments.versions(*map(namespace, keys))
+    # Версия новее начала запроса: данные менялись, пока строилась
+    # страница, и она может их не учитывать.
+    if max(int(value, 16) for value in versions) >= started:
+        return
+    entry = (keys, versions, list(response.items()), response.content)
+    cache.set(key, entry, TIMEOUT)
+
+
+class PageCacheMiddleware:
+    """Отдаёт анонимным посетителям страницы с суррогатными ключами из кэша."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_cacheable(request):
+            return self.get_response(request)
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            response = _restore(request, entry)
+            if response is not None:
+                return response
+        started = time.time_ns()
+        response = self.get_response(request)
+        if request.method == 'GET':
+            _store(key, response, started)
+        return response
@@ -0,0 +1,181 @@
+"""
+Кэш результатов выборок, который сбрасывается по версиям таблиц.
+
+Выборка, для которой вызван `.cached()` (метод менеджера и QuerySet
+у моделей с `CachingManager`, или функция `cached` для остальных),
+берёт результат из кэша по ключу из нормализованного SQL, параметров
+и версий всех таблиц, которые упомянуты в запросе. Версии таблиц —
+пространства имён `core.fragments`.
+
+Версию таблицы меняет не сигнал модели, а сам запрос на запись:
+обёртка над курсором (`install`) замечает INSERT, UPDATE и DELETE
+в отслеживаемую таблицу (`track`), поэтому учитываются и `update()`
+с F() из счётчиков, и удаления каскадом. Внутри транзакции версия
+меняется после коммита; до него выборки по изменённым в транзакции
+таблицам идут мимо кэша, а при откате менять нечего. Запросы
+к неотслеживаемым таблицам не кэшируются вовсе.
+
+Версия одна на таблицу: любая запись в posts_post сбрасывает все
+кэшированные выборки постов. Записей намного меньше, чем чтений,
+поэтому кэш всё равно отвечает на повторы тех же запросов.
+"""
+import hashlib
+import re
+from functools import lru_cache
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.backends.signals import connection_created
+
+from . import fragments
+
+TIMEOUT = 60 * 10  # время жизни результата выборки, секунды
+WRITE = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)'
+    r'\s+["`]?(\w+)',
+    re.IGNORECASE,
+)
+IDENTIFIER = re.compile(r'["`](\w+)["`]')
+
+_tracked = set()  # таблицы, запись в которые меняет их версию
+
+
+def track(*models):
+    """Отслеживать запись в таблицы моделей `models`."""
+    _tracked.update(model._meta.db_table for model in models)
+
+
+def table_namespace(table):
+    return f'table:{table}'
+
+
+class _Bump:
+    """Смена версии таблицы, отложенная до коммита транзакции."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __call__(self):
+        fragments.bump(table_namespace(self.table))
+
+
+def _pending(connection):
+    # Таблицы, изменённые в текущей транзакции. Django сам убирает
+    # отложенные функции при откате, в том числе до точки сохранения.
+    return {
+        func.table for _, func in connection.run_on_commit
+        if isinstance(func, _Bump)
+    }
+
+
+def uncommitted(*models, using=DEFAULT_DB_ALIAS):
+    """
+    Есть ли в текущей транзакции запись в таблицы моделей `models`
+    (без них — в любые отслеживаемые таблицы).
+    """
+    pending = _pending(connections[using])
+    if models:
+        pending &= {model._meta.db_table for model in models}
+    return bool(pending)
+
+
+def _track_writes(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    match = WRITE.match(sql)
+    if match and match.group(1) in _tracked:
+        connection = context['connection']
+        if match.group(1) not in _pending(connection):
+            # вне транзакции выполняется сразу
+            connection.on_commit(_Bump(match.group(1)))
+    return result
+
+
+def _install(connection, **kwargs):
+    if _track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_writes)
+
+
+def install():
+    """Следить за записью во всех соединениях с базой."""
+    connection_created.connect(_install, dispatch_uid='querycache_install')
+    for connection in connections.all():
+        if connection.connection is not None:
+            _install(connection)
+
+
+def cache_key(queryset):
+    """
+    Ключ кэша для выборки или None, если её нельзя кэшировать: пустая,
+    с блокировкой строк, читает неотслеживаемую таблицу или таблицу,
+    изменённую в текущей транзакции.
+    """
+    if queryset.query.select_for_update:
+        return None
+    connection = connections[queryset.db]
+    query = queryset.query.chain()
+    try:
+        sql, params = query.get_compiler(connection=connection).as_sql()
+    except EmptyResultSet:
+        return None
+    tables = set(IDENTIFIER.findall(sql)) & _model_tables()
+    if not tables or not tables <= _tracked:
+        return None
+    if tables & _pending(connection):
+        return None
+    tables = sorted(tables)
+    versions = fragments.versions(*map(table_namespace, tables))
+    key = '|'.join([
+        queryset.db, ' '.join(sql.split()), repr(params), *versions
+    ])
+    return 'query:' + hashlib.md5(key.encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _model_tables():
+    return {model._meta.db_table for model in apps.get_models()}
+
+
+class CachingQuerySet(models.QuerySet):
+    cache_results = False
+
+    def cached(self):
+        """Та же выборка, но с результатом из кэша."""
+        clone = self._chain()
+        clone.cache_results = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.cache_results = self.cache_results
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.cache_results:
+            key = cache_key(self)
+            if key is not None:
+                results = cache.get(key)
+                if results is None:
+                    results = list(self._iterable_class(self))
+                    cache.set(key, results, TIMEOUT)
+                self._result_cache = results
+        super()._fetch_all()
+
+
+CachingManager = models.Manager.from_queryset(CachingQuerySet)
+
+
+def cached(queryset):
+    """
+    `.cached()` для выборки модели со стандартным менеджером, например
+    пользователя.
+    """
+    if not isinstance(queryset, CachingQuerySet):
+        if type(queryset) is not models.QuerySet:
+            raise TypeError(
+                f'Кэшировать можно только QuerySet, а не {type(queryset)}'
+            )
+        queryset = queryset._chain()
+        queryset.__class__ = CachingQuerySet
+    return queryset.cached()
@@ -0,0 +1,185 @@
+"""
+Сборка и отдача статики.
+
+`manage.py collectstatic` с хранилищем `PrecompressedManifestStorage`
+копирует файлы в STATIC_ROOT под именами с хэшем содержимого
+(`css/bootstrap.min.1a2b3c4d5e6f.css`), записывает соответствие имён
+в манифест `staticfiles.json` и кладёт рядом с текстовыми файлами
+сжатые копии `.gz` и, если установлен пакет brotli, `.br`. Манифест
+читается один раз при запуске (см. `core.apps`), и `{% static %}`
+выдаёт имена с хэшем без обращения к диску.
+
+`serve` выбирает по Accept-Encoding готовую сжатую копию, поэтому на
+запрос ничего не сжимается. Файлы из манифеста кэшируются браузером
+на год с `immutable`: при изменении содержимого меняется и имя. За
+nginx то же делают `gzip_static` и `brotli_static`.
+"""
+import gzip
+import mimetypes
+import os
+import stat
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, staticfiles_storage
+)
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+
+from .media import IMMUTABLE_MAX_AGE, MAX_AGE, file_response
+
+try:
+    # сжатие brotli появляется с пакетом brotli
+    import brotli
+except ImportError:
+    brotli = None
+
+# какие файлы сжимать заранее; картинки и шрифты уже сжаты
+COMPRESSIBLE = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml',
+    '.ico',
+)
+MIN_SIZE = 256  # файлы меньше не сжимаются, байты
+# сжатая копия сохраняется, только если она меньше этой доли оригинала
+MAX_RATIO = 0.9
+# кодировки в порядке предпочтения и суффиксы сжатых копий
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _gzip(data):
+    # mtime=0: одинаковое содержимое даёт одинаковый архив
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def compressors():
+    """Суффиксы сжатых копий и функции сжатия, доступные здесь."""
+    available = {'.gz': _gzip}
+    if brotli is not None:
+        available['.br'] = _brotli
+    return available
+
+
+class PrecompressedManifestStorage(ManifestStaticFilesStorage):
+
+    @cached_property
+    def hashed_names(self):
+        """Имена с хэшем из манифеста: их содержимое не меняется."""
+        return frozenset(self.hashed_files.values())
+
+    def stored_name(self, name):
+        # Файла нет в манифесте, если collectstatic ещё не запускали
+        # (разработка, тесты): ссылка ведёт на исходное имя, а не
+        # считает хэш файла на каждый вызов `{% static %}`.
+        path = urlsplit(unquote(name)).path.strip()
+        if self.hash_key(path) not in self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        self.__dict__.pop('hashed_names', None)
+        for name, hashed_name in self.hashed_files.items():
+            self.compress(name)
+            self.compress(hashed_name)
+
+    def compress(self, name):
+        """Положить рядом с файлом его сжатые копии."""
+        if not name.lower().endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < MIN_SIZE:
+            return
+        for suffix, compress in compressors().items():
+            compressed = compress(data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) < len(data) * MAX_RATIO:
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def accepted_encodings(header):
+    """Кодировки из заголовка Accept-Encoding с ненулевым весом."""
+    accepted = set()
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    if '*' in accepted:
+        accepted.update(coding for coding, _ in ENCODINGS)
+    return accepted
+
+
+def _negotiated(request, full_path):
+    # готовая сжатая копия, которую примет клиент, или сам файл
+    accepted = accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    for coding, suffix in ENCODINGS:
+        if coding not in accepted:
+            continue
+        try:
+            stat_result = os.stat(full_path + suffix)
+        except OSError:
+            continue
+        return full_path + suffix, stat_result, coding
+    return full_path, os.stat(full_path), None
+
+
+def serve(request, path):
+    """Отдать файл из STATIC_ROOT, сжатый заранее, если можно."""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+        if not stat.S_ISREG(os.stat(full_path).st_mode):
+            raise Http404('Файл не найден')
+        full_path, stat_result, encoding = _negotiated(request, full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Файл не найден')
+    name = path.replace(os.sep, '/')
+    if name in staticfiles_storage.hashed_names:
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={MAX_AGE}'
+    # у сжатых копий свой размер, а значит и свой ETag
+    etag = '"{:x}-{:x}"'.format(stat_result.st_mtime_ns, stat_result.st_size)
+    last_modified = stat_result.st_mtime
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if response is None:
+        response = file_response(
+            request, full_path, stat_result.st_size, etag, last_modified
+        )
+        if response.status_code != 416:
+            content_type, _ = mimetypes.guess_type(name)
+            response['Content-Type'] = (
+                content_type or 'application/octet-stream'
+            )
+            if encoding:
+                response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,79 @@
+"""
+Файловое хранилище с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого: `posts/ab/abcdef….jpg` для файла,
+загруженного в `posts/`. Одинаковые загрузки (та же фотография от
+разных пользователей или повторное сохранение при редактировании)
+получают одно имя и хранятся один раз, а всё, что привязано к имени
+файла, например миниатюры sorl-thumbnail, переиспользуется.
+
+Файл не знает, сколько записей на него ссылается: удалять его можно
+только после подсчёта ссылок (см. `posts.blobs`). Загрузка того же
+содержимого не записывает существующий файл заново, поэтому после
+подсчёта ссылок его наличие проверяется ещё раз (`restore`).
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+FILE_MODE = 0o644  # права файла, если FILE_UPLOAD_PERMISSIONS не задан
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def hashed_name(name, digest):
+        """Имя файла `name` с содержимым, SHA-256 которого — `digest`."""
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаётся содержимым в `_save`: файл с тем же именем —
+        # тот же файл, суффиксы не нужны.
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        # Хэш считается при записи во временный файл, чтобы не читать
+        # загрузку дважды; готовый файл переименовывается атомарно.
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, suffix='.part'
+        )
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = self.hashed_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or FILE_MODE)
+                os.replace(temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def restore(self, name, content):
+        """
+        Записать `content` под готовым именем `name`, если файла нет:
+        его могли удалить, пока сохранялась загрузка того же содержимого.
+        Возвращает True, если файл записан заново.
+        """
+        if self.exists(name):
+            return False
+        content.seek(0)
+        # `_save` сам добавит каталог по первым символам хэша
+        directory = posixpath.dirname(posixpath.dirname(name))
+        return self._save(
+            posixpath.join(directory, posixpath.basename(name)), content
+        ) == name
@@ -0,0 +1,345 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core import cache as cache_module
+from core.apps import clear_caches
+from core.cache import SQLiteCache, StampedeCache, TieredCache
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.TEST_DIR)
+LOCATION = os.path.join(TEMP_DIR, 'cache.sqlite3')
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': LOCATION,
+    },
+}
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.cache = SQLiteCache(LOCATION, {})
+        # второй экземпляр — как кэш другого процесса
+        self.other = SQLiteCache(LOCATION, {})
+        self.cache.clear()
+
+    def test_shared(self):
+        """Запись одного экземпляра видна другому."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.other.get('key'), {'value': 1})
+        self.assertEqual(self.other.get_many(['key', 'missing']), {
+            'key': {'value': 1}
+        })
+        self.other.delete_many(['key'])
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_once(self):
+        """`add` удаётся только одному, истёкшая запись не мешает."""
+        self.assertTrue(self.cache.add('lock', 'first'))
+        self.assertFalse(self.other.add('lock', 'second'))
+        self.cache.set('expired', 'old', -1)
+        self.assertTrue(self.other.add('expired', 'new'))
+        self.assertEqual(self.cache.get('expired'), 'new')
+
+    def test_expiry(self):
+        self.cache.set('key', 'value', 0.05)
+        self.assertTrue(self.cache.has_key('key'))
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key('key'))
+        self.cache.set('forever', 'value', None)
+        self.assertTrue(self.cache.touch('forever', 10))
+
+    def test_incr(self):
+        self.cache.set('count', 1)
+        self.assertEqual(self.other.incr('count', 2), 3)
+        self.assertEqual(self.cache.get('count'), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_cull(self):
+        """Лишние записи вытесняются, начиная с истекающих раньше."""
+        cache = SQLiteCache(
+            LOCATION, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}}
+        )
+        cache.set('version', 'keep', None)
+        for number in range(120):
+            cache.set(f'key{number}', number, 1000 + number)
+        # чистка идёт раз в CULL_EVERY записей: на сотой записи
+        # вытеснена половина
+        self.assertEqual(
+            len(cache.get_many([f'key{number}' for number in range(120)])),
+            70,
+        )
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key119'), 119)
+        self.assertEqual(cache.get('version'), 'keep')
+
+    def test_cull_without_counting(self):
+        """Пока оценка ниже MAX_ENTRIES, строки при чистке не считаются."""
+        cache = SQLiteCache(LOCATION, {'OPTIONS': {'MAX_ENTRIES': 1000}})
+        statements = []
+        cache._db().set_trace_callback(statements.append)
+        for number in range(300):
+            cache.set(f'key{number}', number)
+        self.assertEqual(
+            [sql for sql in statements if 'count(*)' in sql], []
+        )
+        self.assertEqual(
+            len([sql for sql in statements if 'expires <=' in sql]), 3
+        )
+
+
+@override_settings(CACHES=CACHES)
+class StampedeCacheTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.first = self.stampede()
+        self.second = self.stampede()
+
+    def stampede(self, **options):
+        options = {'LOCK_WAIT': 0.5, **options}
+        return StampedeCache('default', {'OPTIONS': options})
+
+    def test_single_miss(self):
+        """Промах получает один экземпляр, остальные ждут его значения."""
+        self.assertIsNone(self.first.get('fragment'))
+        timer = threading.Timer(0.1, self.first.set, ['fragment', 'page', 60])
+        timer.start()
+        started = time.monotonic()
+        self.assertEqual(self.second.get('fragment'), 'page')
+        self.assertLess(time.monotonic() - started, 0.5)
+        timer.join()
+        self.assertFalse(caches['default'].has_key('stampede_lock:fragment'))
+
+    def test_lock_holder_not_blocked(self):
+        """Взявший блокировку снова получает промах без ожидания."""
+        self.assertIsNone(self.first.get('fragment'))
+        started = time.monotonic()
+        self.assertIsNone(self.first.get('fragment'))
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_wait_limited(self):
+        """Не дождавшись чужого пересчёта, запрос считает сам."""
+        self.assertIsNone(self.first.get('fragment'))
+        second = self.stampede(LOCK_WAIT=0.1)
+        self.assertIsNone(second.get('fragment'))
+
+    def test_stale_while_recomputing(self):
+        """Истёкшее значение отдаётся, пока его пересчитывает другой."""
+        self.first.set('fragment', 'old', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.first.get('fragment'))
+        self.assertEqual(self.second.get('fragment'), 'old')
+        self.first.set('fragment', 'new', 60)
+        self.assertEqual(self.second.get('fragment'), 'new')
+
+    def test_early_expiration(self):
+        """Долгий пересчёт обновляется до срока."""
+        caches['default'].set(
+            'fragment', ('old', time.time() + 1, 100.0), 60
+        )
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            self.assertIsNone(self.first.get('fragment'))
+            self.assertEqual(self.second.get('fragment'), 'old')
+        caches['default'].set(
+            'fragment', ('fresh', time.time() + 1, 0.001), 60
+        )
+        self.assertEqual(self.second.get('fragment'), 'fresh')
+
+    def test_get_or_set(self):
+        self.assertEqual(
+            self.first.get_or_set('key', lambda: 'value'), 'value'
+        )
+        self.assertEqual(self.second.get('key'), 'value')
+
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'SYNC_INTERVAL': 0},
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': LOCATION,
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def other_process(self, **options):
+        """Кэш с собственным L1, как в другом воркере."""
+        options = {**TIERED_CACHES['default']['OPTIONS'], **options}
+        cache_module._tiers.clear()
+        other = TieredCache('shared', {'OPTIONS': options})
+        cache_module._tiers.clear()
+        return other
+
+    def test_local_hit(self):
+        """Повторное чтение не обращается к общему кэшу."""
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        shared_get = caches['shared'].get
+
+        def get(key, *args, **kwargs):
+            self.assertNotEqual(key, 'key')
+            return shared_get(key, *args, **kwargs)
+
+        with mock.patch.object(caches['shared'], 'get', side_effect=get):
+            self.assertEqual(self.cache.get('key'), 'value')
+            self.assertEqual(self.cache.get_many(['key']), {'key': 'value'})
+
+    def test_broadcast(self):
+        """
+        Смена версии, `incr` и удаление в одном процессе выбрасывают
+        ключ из L1 другого.
+        """
+        other = self.other_process()
+        other.set('fragment_version:posts', 'old')
+        other.set('total', 1)
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.get('fragment_version:posts'), 'old')
+        self.assertEqual(self.cache.get('total'), 1)
+        other.set_many({'fragment_version:posts': 'new'})
+        other.incr('total')
+        other.delete('counter')
+        self.assertEqual(self.cache.get('fragment_version:posts'), 'new')
+        self.assertEqual(self.cache.get('total'), 2)
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_fills_not_broadcast(self):
+        """Заполнение кэша в другом процессе не очищает L1."""
+        other = self.other_process()
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        generation = caches['shared'].get(cache_module.GENERATION_KEY)
+        for number in range(cache_module.MAX_EVENTS * 2):
+            other.set(f'query:{number}', number)
+        other.set_many({'page:1': 'page', 'page:2': 'page'})
+        self.assertEqual(
+            caches['shared'].get(cache_module.GENERATION_KEY), generation
+        )
+        with mock.patch.object(caches['shared'], 'get_many') as get_many:
+            self.assertEqual(self.cache.get_many(['key']), {'key': 'value'})
+        get_many.assert_not_called()
+
+    def test_clear_broadcast(self):
+        other = self.other_process()
+        self.cache.set('key', 'value')
+        other.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_lost_events(self):
+        """Если сообщения потеряны, L1 очищается целиком."""
+        other = self.other_process()
+        self.cache.set('key', 'value')
+        caches['shared'].set('key', 'changed')
+        other.delete('unrelated')
+        caches['shared'].delete(cache_module.event_key(
+            caches['shared'].get(cache_module.GENERATION_KEY)
+        ))
+        self.assertEqual(self.cache.get('key'), 'changed')
+
+    def test_bounded(self):
+        cache = self.other_process(MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(list(cache._tier.entries), [
+            cache.make_key('b'), cache.make_key('c')
+        ])
+
+    def test_stats_published_rarely(self):
+        """Сверка не пишет счётчики в L2 чаще STATS_INTERVAL."""
+        self.cache.reset_stats()
+        other = self.other_process()
+        for _ in range(3):
+            other.get('missing')
+        self.assertIsNone(
+            caches['shared'].get(cache_module.stat_key('misses'))
+        )
+        other = self.other_process(STATS_INTERVAL=0)
+        other.get('missing')
+        other.get('missing')
+        self.assertEqual(
+            caches['shared'].get(cache_module.stat_key('misses')), 1
+        )
+
+    def test_stats(self):
+        """Попадания считаются по уровням и выводятся командой."""
+        self.cache.reset_stats()
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        other = self.other_process()
+        other.get('key')
+        # процесс передаёт свои счётчики в L2 при сверке
+        other.stats()
+        self.cache.get('missing')
+        self.assertEqual(
+            self.cache.stats(), {'l1_hits': 1, 'l2_hits': 1, 'misses': 1}
+        )
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertIn('Итого попаданий: 66.7%', out.getvalue())
+        self.assertEqual(
+            self.cache.stats(), {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+        )
+
+
+class ClearCachesTest(SimpleTestCase):
+    """Очистка кэша после миграций и `flush`."""
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.set('key', 'value')
+
+    def test_tests_use_own_cache(self):
+        """Тесты не очищают файл кэша запущенного сайта."""
+        self.assertEqual(
+            settings.CACHES['shared']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache',
+        )
+
+    def test_migrate_without_changes(self):
+        clear_caches(plan=[])
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_applied_migrations_and_flush(self):
+        for kwargs in ({'plan': [(mock.sentinel.migration, False)]}, {}):
+            with self.subTest(kwargs=kwargs):
+                self.cache.set('key', 'value')
+                shared = caches['shared']
+                with mock.patch.object(
+                    shared, 'clear', wraps=shared.clear
+                ) as clear:
+                    clear_caches(**kwargs)
+                self.assertIsNone(self.cache.get('key'))
+                clear.assert_called_once_with()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+DIGEST = 'ab' + '0' * 62
+HASHED = f'posts/ab/{DIGEST}.png'
+PLAIN = 'posts/plain.txt'
+CONTENT = b'0123456789'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE=None)
+class MediaServeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED, PLAIN):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest = Client()
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_whole_file(self):
+        """Файл отдаётся целиком с типом, длиной и валидаторами."""
+        response = self.guest.get('/media/' + PLAIN)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('Last-Modified', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_hashed_file_immutable(self):
+        """Файл с именем из хэша кэшируется надолго, ETag — хэш."""
+        response = self.guest.get('/media/' + HASHED)
+        self.assertEqual(response['ETag'], f'"{DIGEST}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.guest.get(
+            '/media/' + HASHED, HTTP_IF_NONE_MATCH=f'"{DIGEST}"'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_ranges(self):
+        """Диапазоны байт отдаются с кодом 206."""
+        cases = {
+            'bytes=2-4': (b'234', 'bytes 2-4/10'),
+            'bytes=7-': (b'789', 'bytes 7-9/10'),
+            'bytes=-2': (b'89', 'bytes 8-9/10'),
+            'bytes=8-100': (b'89', 'bytes 8-9/10'),
+        }
+        for header, (body, content_range) in cases.items():
+            with self.subTest(header=header):
+                response = self.guest.get('/media/' + PLAIN, HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT
+                )
+                self.assertEqual(self.body(response), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+
+    def test_unsatisfiable_range(self):
+        response = self.guest.get('/media/' + PLAIN, HTTP_RANGE='bytes=20-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_mismatch(self):
+        """При устаревшем If-Range файл отдаётся целиком."""
+        response = self.guest.get(
+            '/media/' + HASHED, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_missing_and_outside(self):
+        for url in ('/media/posts/missing.png', '/media/../settings.py',
+                    '/media/posts'):
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """С nginx тело отдаёт веб-сервер, Django ставит заголовки."""
+        response = self.guest.get('/media/' + HASHED)
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/' + HASHED
+        )
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.guest.get('/media/' + PLAIN)
+        self.assertEqual(
+            response['X-Sendfile'], os.path.join(TEMP_MEDIA_ROOT, PLAIN)
+        )
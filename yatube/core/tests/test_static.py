@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+
+from core import static
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.TEST_DIR)
+SOURCE_DIR = os.path.join(TEMP_DIR, 'source')
+STATIC_ROOT = os.path.join(TEMP_DIR, 'collected')
+CSS = (
+    'body { background: url("../img/logo.png"); }\n'
+    + '.card { margin: 0 auto; padding: 1rem; }\n' * 50
+).encode()
+
+
+@override_settings(
+    STATICFILES_DIRS=[SOURCE_DIR],
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_STORAGE='core.static.PrecompressedManifestStorage',
+)
+class StaticFilesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        files = {'css/site.css': CSS, 'img/logo.png': b'\x89PNG' * 100}
+        for name, content in files.items():
+            path = os.path.join(SOURCE_DIR, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(content)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(STATIC_ROOT, 'staticfiles.json')) as file:
+            cls.manifest = json.load(file)['paths']
+        cls.css = cls.manifest['css/site.css']
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.guest = Client()
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_hashed_and_compressed(self):
+        """Сборка даёт имена с хэшем и сжатые копии текстовых файлов."""
+        self.assertRegex(self.css, r'^css/site\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(STATIC_ROOT, self.css + '.gz'), 'rb') as file:
+            compressed = gzip.decompress(file.read())
+        self.assertIn(self.manifest['img/logo.png'].encode(), compressed)
+        png = os.path.join(STATIC_ROOT, self.manifest['img/logo.png'])
+        self.assertFalse(os.path.exists(png + '.gz'))
+
+    def test_template_url(self):
+        """`{% static %}` ссылается на имя из манифеста."""
+        rendered = Template(
+            "{% load static %}{% static 'css/site.css' %}"
+        ).render(Context())
+        self.assertEqual(rendered, settings.STATIC_URL + self.css)
+
+    def test_negotiated(self):
+        """Клиент, принимающий gzip, получает сжатую копию."""
+        response = self.guest.get(
+            settings.STATIC_URL + self.css, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(
+            self.manifest['img/logo.png'].encode(),
+            gzip.decompress(self.body(response)),
+        )
+
+    def test_identity(self):
+        """Без Accept-Encoding отдаётся сам файл."""
+        response = self.guest.get(
+            settings.STATIC_URL + self.css, HTTP_ACCEPT_ENCODING='gzip;q=0'
+        )
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(
+            response['Content-Length'],
+            str(os.path.getsize(os.path.join(STATIC_ROOT, self.css))),
+        )
+
+    def test_unhashed_name_short_cache(self):
+        response = self.guest.get(settings.STATIC_URL + 'css/site.css')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_missing(self):
+        for path in ('css/missing.css', '../collected/staticfiles.json/x'):
+            with self.subTest(path=path):
+                response = self.guest.get(settings.STATIC_URL + path)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @skipUnless(static.brotli, 'пакет brotli не установлен')
+    def test_brotli_preferred(self):
+        response = self.guest.get(
+            settings.STATIC_URL + self.css, HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_page_weight(self):
+        """Отчёт учитывает страницу и подключённую статику."""
+        out = StringIO()
+        call_command('report_page_weight', '/about/tech/', stdout=out)
+        logo = settings.STATIC_URL + self.manifest['img/logo.png']
+        self.assertRegex(out.getvalue(), rf'400 +200 +immutable +{logo}')
+        self.assertIn('Всего для /about/tech/', out.getvalue())
+
+
+class AcceptEncodingTest(TestCase):
+    def test_parsed(self):
+        cases = {
+            '': set(),
+            'gzip, deflate, br': {'gzip', 'deflate', 'br'},
+            'br;q=0, gzip;q=0.5': {'gzip'},
+            '*': {'*', 'br', 'gzip'},
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(static.accepted_encodings(header), expected)
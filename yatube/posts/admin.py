@@ -1,7 +1,9 @@
 from django.contrib import admin
 
 # Register your models here.
+from . import search
 from .models import Post, Group, Comment
+from .pagination import EstimatedCountPaginator
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -13,11 +15,45 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице — полнотекстовый индекс
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Формы строк списка копируют поле: без готового списка
+            # вариантов каждая строка заново выбирала бы все группы.
+            field.choices = list(field.choices)
+        return field
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title',)
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    list_filter = ('created',)
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
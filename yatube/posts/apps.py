@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name: str = 'Создание публикации'
+
+    def ready(self):
+        from core import querycache
+
+        from . import signals  # noqa: F401
+        from .models import Comment, Follow, Group, Post, User, UserCounter
+
+        # таблицы, выборки из которых можно кэшировать (см. `.cached()`)
+        querycache.track(Post, Group, Comment, Follow, User, UserCounter)
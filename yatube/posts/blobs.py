@@ -0,0 +1,81 @@
+"""
+Ссылки постов на файлы картинок.
+
+Картинки постов лежат в хранилище по содержимому (`core.storage`):
+один файл может принадлежать нескольким постам. Сколько постов
+ссылается на файл, хранит `MediaBlob`; сигналы (см. `posts.signals`)
+меняют счётчик в той же транзакции, что и пост. Когда ссылок не
+остаётся, файл и его миниатюры удаляются после фиксации транзакции.
+
+Удаление и новая ссылка на тот же файл упорядочены блокировкой строки
+`MediaBlob`: удаление перепроверяет ссылки под блокировкой, а новая
+ссылка, взятая после удаления, записывает файл заново из загрузки.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from . import thumbnails
+from .models import MediaBlob, Post
+
+logger = logging.getLogger(__name__)
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def acquire(name, content=None):
+    """
+    Пост стал ссылаться на файл. `content` — загруженное содержимое
+    файла: хранилище не записывает его повторно, если файл уже есть,
+    а `delete_unused` мог удалить его, пока пост сохранялся.
+    """
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name)], ignore_conflicts=True
+    )
+    MediaBlob.objects.filter(pk=name).update(refs=F('refs') + 1)
+    # Строка заблокирована до конца транзакции: удаление, начатое
+    # позже, увидит ссылку, а закончившееся раньше — видно здесь.
+    if content is not None and _storage().restore(name, content):
+        logger.info('Картинка %s удалена при загрузке, записана заново', name)
+
+
+def release(name):
+    """Пост перестал ссылаться на файл."""
+    MediaBlob.objects.filter(pk=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    transaction.on_commit(lambda: delete_unused(name))
+
+
+def delete_unused(name):
+    """
+    Удалить файл, миниатюры и запись о нём, если ссылок не осталось.
+    Ссылки проверяются заново: файл мог снова понадобиться, пока
+    транзакция фиксировалась.
+    """
+    with transaction.atomic():
+        # Ссылку в это время берёт `acquire`: он ждёт блокировку строки
+        # и после удаления файла запишет его заново.
+        blob = MediaBlob.objects.select_for_update().filter(pk=name).first()
+        if blob is not None and blob.refs > 0:
+            return False
+        if Post.objects.filter(image=name).exists():
+            # счётчик разошёлся с постами, например после bulk_create
+            return False
+        MediaBlob.objects.filter(pk=name).delete()
+        try:
+            delete(ImageFile(name, _storage()))
+        except (OSError, SuspiciousFileOperation):
+            # например, имя указывает за пределы хранилища
+            logger.warning(
+                'Не удалось удалить картинку %s', name, exc_info=True
+            )
+            return False
+    thumbnails.forget(name)
+    return True
@@ -0,0 +1,115 @@
+"""
+Условные GET-запросы для лент и страницы поста.
+
+Валидаторы страницы (ETag и Last-Modified) строятся из версий
+пространств имён `core.fragments`, которые сигналы (см.
+`posts.signals`) меняют при изменении постов, групп, комментариев,
+подписок и авторов. Проверка не рендерит шаблон, а для лент не
+обращается к базе: если версии не менялись, клиент получает 304.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.views.decorators.http import condition
+
+from core import fragments
+
+from .models import Post
+
+User = get_user_model()
+
+POSTS_NAMESPACE = 'posts'  # списки постов: главная, группы, профили
+
+
+def follow_namespace(user_id):
+    # подписки пользователя: его лента и кнопка «Подписаться»
+    return f'follow:{user_id}'
+
+
+def author_namespace(author_id):
+    # счётчики постов и подписок автора
+    return f'author:{author_id}'
+
+
+def author_card_namespace(author_id):
+    # подпись автора в карточках его постов
+    return f'author_card:{author_id}'
+
+
+def post_namespace(post_id):
+    # пост и комментарии к нему
+    return f'post:{post_id}'
+
+
+def group_namespace(group_id):
+    return f'group:{group_id}'
+
+
+def _page_versions(request, namespaces, args, kwargs):
+    # Декоратор condition спрашивает и ETag, и Last-Modified:
+    # пространства имён вычисляются один раз на запрос.
+    if not hasattr(request, '_page_versions'):
+        names = namespaces(request, *args, **kwargs)
+        request._page_versions = (
+            None if names is None else fragments.versions(*names)
+        )
+    return request._page_versions
+
+
+def conditional_page(namespaces):
+    """
+    Отвечать 304 на повторный запрос страницы, если не сменилась ни одна
+    версия из `namespaces(request, *args, **kwargs)`. Функция возвращает
+    None, если объекта нет: тогда проверка пропускается.
+    """
+    def etag(request, *args, **kwargs):
+        versions = _page_versions(request, namespaces, args, kwargs)
+        if versions is None:
+            return None
+        # Страница зависит от пользователя и от номера страницы/курсора.
+        key = '|'.join(
+            [str(request.user.pk), request.get_full_path()] + versions
+        )
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        versions = _page_versions(request, namespaces, args, kwargs)
+        if versions is None:
+            return None
+        return fragments.changed_at(*versions)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def feed_namespaces(request, *args, **kwargs):
+    return [POSTS_NAMESPACE]
+
+
+def follow_namespaces(request):
+    return [POSTS_NAMESPACE, follow_namespace(request.user.pk)]
+
+
+def profile_namespaces(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [
+        POSTS_NAMESPACE,
+        author_namespace(author_id),
+        follow_namespace(request.user.pk),
+    ]
+
+
+def post_namespaces(request, post_id):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if post is None:
+        return None
+    author_id, group_id = post
+    names = [post_namespace(post_id), author_namespace(author_id)]
+    if group_id is not None:
+        names.append(group_namespace(group_id))
+    return names
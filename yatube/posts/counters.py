@@ -0,0 +1,298 @@
+"""
+Счётчики постов, комментариев и подписок.
+
+Счётчики хранятся в базе: `Group.posts_count`, `Post.comments_count` и
+`UserCounter` (посты, подписчики и подписки пользователя). Сигналы
+(см. `posts.signals`) меняют их выражениями F() в той же транзакции,
+что и сама запись, поэтому ленты и профили не выполняют COUNT(*).
+
+Для паджинаторов значения дополнительно кэшируются: при изменении
+счётчика ключ удаляется после коммита транзакции и при следующем
+чтении берётся из базы. Транзакция, которая уже изменила счётчики,
+читает их мимо кэша: там ещё прежние значения, а её собственные до
+коммита никому больше не видны.
+Общее количество постов хранится только в кэше. Расхождения устраняет
+команда `manage.py rebuild_counters`.
+"""
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core import querycache
+
+from .models import Comment, Follow, Group, Post, User, UserCounter
+
+COUNT_TIMEOUT = 60 * 60  # время жизни счётчика в кэше, секунды
+TOTAL_KEY = 'post_count:all'
+
+
+def group_key(group_id):
+    return f'post_count:group:{group_id}'
+
+
+def author_key(author_id):
+    return f'post_count:author:{author_id}'
+
+
+def follower_key(author_id):
+    return f'follower_count:{author_id}'
+
+
+def _uncommitted():
+    return querycache.uncommitted(Post, Group, UserCounter)
+
+
+def _get_or_read(key, read):
+    if _uncommitted():
+        return read()
+    count = cache.get(key)
+    if count is None:
+        count = read()
+        cache.add(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def _read_column(model, pk, field):
+    return model.objects.filter(pk=pk).values_list(
+        field, flat=True
+    ).first() or 0
+
+
+def total_count():
+    """Количество всех постов на сайте."""
+    return _get_or_read(TOTAL_KEY, Post.objects.count)
+
+
+def group_count(group_id):
+    """Количество постов в сообществе."""
+    return _get_or_read(
+        group_key(group_id),
+        lambda: _read_column(Group, group_id, 'posts_count')
+    )
+
+
+def author_count(author_id):
+    """Количество постов автора."""
+    return _get_or_read(
+        author_key(author_id),
+        lambda: _read_column(UserCounter, author_id, 'posts_count')
+    )
+
+
+def _get_many_or_read(ids, key, field):
+    keys = {key(pk): pk for pk in ids}
+    uncommitted = _uncommitted()
+    cached = {} if uncommitted else cache.get_many(keys)
+    counts = {keys[cache_key]: count for cache_key, count in cached.items()}
+    missing = [pk for cache_key, pk in keys.items() if cache_key not in cached]
+    if missing:
+        stored = dict(
+            UserCounter.objects.filter(pk__in=missing).values_list(
+                'pk', field
+            )
+        )
+        read = {pk: stored.get(pk, 0) for pk in missing}
+        if not uncommitted:
+            cache.set_many(
+                {key(pk): count for pk, count in read.items()},
+                COUNT_TIMEOUT
+            )
+        counts.update(read)
+    return counts
+
+
+def author_counts(author_ids):
+    """
+    Количество постов для нескольких авторов: недостающие в кэше
+    значения читаются одним запросом.
+    """
+    return _get_many_or_read(author_ids, author_key, 'posts_count')
+
+
+def follower_count(author_id):
+    """Количество подписчиков автора."""
+    return _get_or_read(
+        follower_key(author_id),
+        lambda: _read_column(UserCounter, author_id, 'followers_count')
+    )
+
+
+def follower_counts(author_ids):
+    """Количество подписчиков для нескольких авторов."""
+    return _get_many_or_read(author_ids, follower_key, 'followers_count')
+
+
+def feed_count(user_id):
+    """
+    Количество постов в ленте подписок: сумма счётчиков авторов, на
+    которых подписан пользователь.
+    """
+    author_ids = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    )
+    return sum(author_counts(list(author_ids)).values())
+
+
+def _change(queryset, field, delta):
+    # Уменьшаем только положительные значения: после расхождения
+    # счётчик не должен уйти ниже нуля.
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _change_user(user_id, field, delta):
+    # Строки может не быть, если пользователь создан в обход сигналов
+    # (bulk_create): её заведёт `rebuild_counters`.
+    _change(UserCounter.objects.filter(pk=user_id), field, delta)
+
+
+def _forget(*keys):
+    # До коммита конкурентный запрос прочитал бы из базы прежнее
+    # значение и снова положил его в кэш, а при откате менять нечего.
+    transaction.on_commit(partial(cache.delete_many, list(keys)))
+
+
+def _incr_total(delta):
+    try:
+        cache.incr(TOTAL_KEY, delta)
+    except ValueError:
+        # ключа нет в кэше: значение будет посчитано при первом чтении
+        pass
+
+
+def _shift_total(delta):
+    transaction.on_commit(partial(_incr_total, delta))
+
+
+def user_added(user):
+    UserCounter.objects.get_or_create(user=user)
+
+
+def post_added(post):
+    _shift_total(1)
+    _change_user(post.author_id, 'posts_count', 1)
+    _forget(author_key(post.author_id))
+    if post.group_id is not None:
+        _change(Group.objects.filter(pk=post.group_id), 'posts_count', 1)
+        _forget(group_key(post.group_id))
+
+
+def post_removed(post):
+    _shift_total(-1)
+    _change_user(post.author_id, 'posts_count', -1)
+    _forget(author_key(post.author_id))
+    if post.group_id is not None:
+        _change(Group.objects.filter(pk=post.group_id), 'posts_count', -1)
+        _forget(group_key(post.group_id))
+
+
+def post_moved(old_group_id, new_group_id):
+    for group_id, delta in ((old_group_id, -1), (new_group_id, 1)):
+        if group_id is not None:
+            _change(Group.objects.filter(pk=group_id), 'posts_count', delta)
+            _forget(group_key(group_id))
+
+
+def group_removed(group_id):
+    _forget(group_key(group_id))
+
+
+def comment_added(comment):
+    _change(Post.objects.filter(pk=comment.post_id), 'comments_count', 1)
+
+
+def comment_removed(comment):
+    _change(Post.objects.filter(pk=comment.post_id), 'comments_count', -1)
+
+
+def follow_added(follow):
+    _change_user(follow.author_id, 'followers_count', 1)
+    _change_user(follow.user_id, 'following_count', 1)
+    _forget(follower_key(follow.author_id))
+
+
+def follow_removed(follow):
+    _change_user(follow.author_id, 'followers_count', -1)
+    _change_user(follow.user_id, 'following_count', -1)
+    _forget(follower_key(follow.author_id))
+
+
+def _count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+def rebuild_users(user_ids):
+    """Пересчитать по базе счётчики пользователей."""
+    existing = set(
+        UserCounter.objects.filter(pk__in=user_ids).values_list(
+            'pk', flat=True
+        )
+    )
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=pk) for pk in user_ids if pk not in existing],
+        ignore_conflicts=True
+    )
+    UserCounter.objects.filter(pk__in=user_ids).update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+    _forget(
+        *[author_key(pk) for pk in user_ids],
+        *[follower_key(pk) for pk in user_ids],
+    )
+
+
+def rebuild_groups(group_ids):
+    """Пересчитать по базе счётчики постов в группах."""
+    Group.objects.filter(pk__in=group_ids).update(
+        posts_count=_count(Post, 'group')
+    )
+    _forget(*[group_key(pk) for pk in group_ids])
+
+
+def rebuild_posts(post_ids):
+    """Пересчитать по базе счётчики комментариев к постам."""
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count(Comment, 'post')
+    )
+
+
+def _in_batches(model, rebuild, batch_size):
+    rebuilt = 0
+    ids = model.objects.order_by('pk').values_list('pk', flat=True)
+    batch = []
+    for pk in ids.iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) == batch_size:
+            rebuild(batch)
+            rebuilt += len(batch)
+            batch = []
+    if batch:
+        rebuild(batch)
+        rebuilt += len(batch)
+    return rebuilt
+
+
+def rebuild(batch_size=1000):
+    """
+    Пересчитать все счётчики по базе пачками по `batch_size` объектов.
+    Возвращает количество пересчитанных пользователей, групп и постов.
+    """
+    # удаление, а не запись: его видят L1 всех процессов
+    cache.delete(TOTAL_KEY)
+    return {
+        'users': _in_batches(User, rebuild_users, batch_size),
+        'groups': _in_batches(Group, rebuild_groups, batch_size),
+        'posts': _in_batches(Post, rebuild_posts, batch_size),
+    }
@@ -0,0 +1,254 @@
+"""
+Лента подписок по гибридной схеме push/pull.
+
+Посты обычных авторов раскладываются подписчикам заранее (fan-out on
+write): при публикации поста, при подписке (подгружаются посты автора)
+и при отписке (записи автора удаляются). Посты популярных авторов, у
+которых подписчиков не меньше `settings.FEED_CELEBRITY_FOLLOWERS`,
+не раскладываются — иначе один пост превращался бы в миллионы записей.
+Их посты подтягиваются при чтении ленты и сливаются с разложенными
+в порядке (pub_date, id).
+
+Автор, которого отписка опустила ниже порога, раскладывается заново
+его подписчикам; решение принимается по счётчику подписчиков, без
+подсчёта записей ленты. Авторы ниже порога, у которых разложено не
+всё после смены порога или расхождения счётчиков, находятся командой
+`manage.py rebuild_feed`: она сверяет записи с подписчиками и постами
+по базе.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Count
+
+from . import counters
+from .models import FeedEntry, Follow, Post
+from .pagination import keyset_filter
+
+BATCH_SIZE = 500  # сколько записей ленты вставлять за один запрос
+
+
+def is_celebrity(author_id):
+    """Автор слишком популярен, чтобы раскладывать его посты."""
+    return (
+        counters.follower_count(author_id)
+        >= settings.FEED_CELEBRITY_FOLLOWERS
+    )
+
+
+def is_pushed(author_id, followers, posts):
+    """
+    Все посты автора разложены всем его подписчикам. Считает записи
+    ленты автора, поэтому нужен только `rebuild`, а не запросам.
+    """
+    entries = FeedEntry.objects.filter(author_id=author_id).count()
+    return entries >= followers * posts
+
+
+def _insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def push_post(post):
+    """Разложить новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in follower_ids.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту подписчика уже опубликованные посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by().values_list(
+        'id', 'pub_date'
+    )
+    _insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убрать из ленты подписчика посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def demote(author_id):
+    """
+    Автор перестал быть популярным: его посты больше не подтягиваются
+    при чтении, поэтому раскладываем их оставшимся подписчикам.
+    Подписчиков в этот момент меньше порога, так что объём работы
+    ограничен; уже разложенные записи пропускаются.
+    """
+    follower_ids = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    posts = list(
+        Post.objects.filter(author_id=author_id).order_by().values_list(
+            'id', 'pub_date'
+        )
+    )
+    _insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in follower_ids.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def author_unfollowed(follow):
+    prune(follow.user_id, follow.author_id)
+    # Порог пересекла именно эта отписка: до неё посты автора не
+    # раскладывались. Счётчик уже уменьшен в той же транзакции.
+    followers = counters.follower_count(follow.author_id)
+    if followers == settings.FEED_CELEBRITY_FOLLOWERS - 1:
+        demote(follow.author_id)
+
+
+def rebuild():
+    """
+    Разложить посты всех авторов ниже порога популярности, у которых
+    разложено не всё. Подписчики и посты считаются по базе, а не по
+    счётчикам. Возвращает количество разложенных заново авторов.
+    """
+    authors = Follow.objects.order_by().values('author_id').annotate(
+        followers=Count('pk')
+    ).filter(followers__lt=settings.FEED_CELEBRITY_FOLLOWERS)
+    rebuilt = 0
+    for author in authors.iterator():
+        author_id = author['author_id']
+        posts = Post.objects.filter(author_id=author_id).count()
+        if not is_pushed(author_id, author['followers'], posts):
+            demote(author_id)
+            rebuilt += 1
+    return rebuilt
+
+
+class HybridFeed:
+    """
+    Лента подписок пользователя: разложенные записи FeedEntry,
+    слитые с постами популярных авторов.
+
+    Поддерживает ровно то, что нужно `CursorPaginator`: фиксированный
+    порядок (pub_date, id), сдвиг по ключу, разворот и срезы.
+    """
+
+    model = Post
+    ordered = True
+
+    def __init__(self, user_id, celebrity_ids, seek=None, ascending=False):
+        self.user_id = user_id
+        self.celebrity_ids = list(celebrity_ids)
+        self._seek = seek
+        self._ascending = ascending
+
+    def order_by(self, *fields):
+        # порядок ленты задан ключом (pub_date, id) и не меняется
+        return self
+
+    def reverse(self):
+        return HybridFeed(
+            self.user_id, self.celebrity_ids, self._seek,
+            not self._ascending
+        )
+
+    def seek(self, values, lookup):
+        return HybridFeed(
+            self.user_id, self.celebrity_ids, (values, lookup),
+            self._ascending
+        )
+
+    def _ordering(self, keys):
+        if self._ascending:
+            return keys
+        return ['-' + key for key in keys]
+
+    def _pushed(self):
+        keys = ['pub_date', 'post_id']
+        entries = FeedEntry.objects.filter(user_id=self.user_id)
+        if self._seek is not None:
+            entries = entries.filter(keyset_filter(keys, *self._seek))
+        return entries.select_related(
+            'post__author', 'post__group'
+        ).order_by(*self._ordering(keys))
+
+    def _pulled(self, author_id):
+        # По запросу на автора: выборка по `author_id IN (...)` не может
+        # идти по индексу (author, pub_date) без сортировки.
+        keys = ['pub_date', 'id']
+        posts = Post.objects.filter(author_id=author_id)
+        if self._seek is not None:
+            posts = posts.filter(keyset_filter(keys, *self._seek))
+        return posts.select_related(
+            'author', 'group'
+        ).order_by(*self._ordering(keys))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        stop = index.stop
+        sources = [(entry.post for entry in self._pushed()[:stop])]
+        sources.extend(
+            iter(self._pulled(author_id)[:stop])
+            for author_id in self.celebrity_ids
+        )
+        # Пост мог попасть в оба источника, если автор стал популярным
+        # уже после раскладки: такие дубли стоят рядом и отбрасываются.
+        merged = []
+        seen = set()
+        for post in heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.id),
+            reverse=not self._ascending,
+        ):
+            if post.id in seen:
+                continue
+            seen.add(post.id)
+            merged.append(post)
+            if len(merged) == stop:
+                break
+        return merged[index.start:stop]
+
+    def count(self):
+        return counters.feed_count(self.user_id)
+
+
+def feed_for(user):
+    """Собрать ленту подписок пользователя."""
+    author_ids = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    )
+    followers = counters.follower_counts(list(author_ids))
+    celebrity_ids = [
+        author_id for author_id, count in followers.items()
+        if count >= settings.FEED_CELEBRITY_FOLLOWERS
+    ]
+    return HybridFeed(user.id, celebrity_ids)
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from .ingest import ingest_image
 from .models import Post, Comment
 
 
@@ -7,6 +10,13 @@ class PostForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['group'].empty_label = "Группа не выбрана"
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # при редактировании без новой загрузки здесь сохранённый файл
+        if isinstance(image, UploadedFile):
+            image = ingest_image(image)
+        return image
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
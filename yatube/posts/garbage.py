@@ -0,0 +1,226 @@
+"""
+Сборка мусора в медиафайлах.
+
+Файлы картинок, миниатюры и записи о них в хранилище sorl-thumbnail
+могут остаться без хозяина: пост удалён в обход сигналов, удаление
+файла после фиксации транзакции не удалось, миниатюры построены для
+прежнего хранилища (до `core.storage`) или файл записан, а транзакция
+с постом откатилась. `collect` находит и удаляет такие файлы и записи.
+
+Всё просматривается пачками по `batch_size`: записи хранилища —
+по ключу, файлы — обходом каталогов, а ссылки проверяются одним
+запросом на пачку. Поэтому сборку можно запускать на работающем
+сайте. Файлы моложе `grace` секунд не трогаются: их могли только что
+записать, а пост или запись о миниатюре ещё не сохранены.
+"""
+import json
+import os
+import time
+from collections import Counter
+
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import blobs
+from .models import MediaBlob, Post
+
+BATCH_SIZE = 500  # сколько файлов или записей проверять за один запрос
+GRACE = 60 * 60  # возраст, с которого ненужный файл удаляется, секунды
+
+
+def _image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def _batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _entries(identity, batch_size):
+    """Записи хранилища sorl-thumbnail пачками: (ключ, значение)."""
+    prefix = add_prefix('', identity)
+    last = prefix
+    while True:
+        batch = list(
+            KVStoreModel.objects.filter(
+                key__startswith=prefix, key__gt=last
+            ).order_by('key').values_list('key', 'value')[:batch_size]
+        )
+        if not batch:
+            return
+        last = batch[-1][0]
+        yield [(del_prefix(key), value) for key, value in batch]
+
+
+def _files(storage, directory):
+    """Файлы каталога хранилища: (имя, размер, время изменения)."""
+    root = storage.path(directory)
+    for path, _, names in os.walk(root):
+        for filename in names:
+            full_path = os.path.join(path, filename)
+            try:
+                stat = os.stat(full_path)
+            except FileNotFoundError:
+                continue
+            name = os.path.relpath(full_path, storage.location)
+            yield name.replace(os.sep, '/'), stat.st_size, stat.st_mtime
+
+
+def _referenced(names):
+    names = list(names)
+    return set(
+        Post.objects.filter(image__in=names).values_list('image', flat=True)
+    ) | set(
+        MediaBlob.objects.filter(pk__in=names, refs__gt=0).values_list(
+            'pk', flat=True
+        )
+    )
+
+
+def _size(image_file):
+    try:
+        return image_file.storage.size(image_file.name)
+    except OSError:
+        return 0
+
+
+def _drop_thumbnails(key, stats, dry_run):
+    # миниатюры картинки с ключом `key`: файлы и записи о них
+    thumbnail_keys = default.kvstore._get(key, identity='thumbnails') or []
+    for thumbnail_key in thumbnail_keys:
+        thumbnail = default.kvstore._get(thumbnail_key)
+        if thumbnail is None:
+            continue
+        stats['thumbnails'] += 1
+        stats['bytes'] += _size(thumbnail)
+        if not dry_run:
+            thumbnail.delete()
+            default.kvstore._delete(thumbnail_key)
+    stats['entries'] += len(thumbnail_keys) + 1
+    if not dry_run:
+        default.kvstore._delete(key, identity='thumbnails')
+
+
+def collect_sources(stats, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Записи о картинках постов, на которые не ссылается ни один пост или
+    которые открыты не через хранилище поля, вместе с миниатюрами.
+    """
+    directory = Post._meta.get_field('image').upload_to
+    storage = ImageFile(directory, _image_storage()).serialize_storage()
+    for batch in _entries('image', batch_size):
+        # миниатюры и чужие картинки тоже лежат в записях 'image'
+        sources = {}
+        for key, value in batch:
+            source = json.loads(value)
+            if source['name'].startswith(directory):
+                sources[key] = source
+        referenced = _referenced(
+            source['name'] for source in sources.values()
+        )
+        for key, source in sources.items():
+            if (
+                source['name'] in referenced
+                and source['storage'] == storage
+            ):
+                continue
+            _drop_thumbnails(key, stats, dry_run)
+            if not dry_run:
+                default.kvstore._delete(key)
+
+
+def collect_thumbnail_lists(stats, batch_size=BATCH_SIZE, dry_run=False):
+    """Списки миниатюр, запись об исходной картинке которых пропала."""
+    for batch in _entries('thumbnails', batch_size):
+        keys = [key for key, _ in batch]
+        present = {
+            del_prefix(key) for key in KVStoreModel.objects.filter(
+                key__in=[add_prefix(key) for key in keys]
+            ).values_list('key', flat=True)
+        }
+        for key in keys:
+            if key not in present:
+                _drop_thumbnails(key, stats, dry_run)
+
+
+def collect_thumbnail_files(stats, batch_size=BATCH_SIZE, grace=GRACE,
+                            dry_run=False):
+    """Файлы миниатюр, о которых нет записи в хранилище sorl-thumbnail."""
+    storage = default.storage
+    deadline = time.time() - grace
+    files = _files(storage, thumbnail_settings.THUMBNAIL_PREFIX)
+    for batch in _batches(files, batch_size):
+        keys = {
+            add_prefix(ImageFile(name, storage).key): (name, size, mtime)
+            for name, size, mtime in batch
+        }
+        known = set(
+            KVStoreModel.objects.filter(key__in=list(keys)).values_list(
+                'key', flat=True
+            )
+        )
+        for key, (name, size, mtime) in keys.items():
+            if key in known or mtime > deadline:
+                continue
+            stats['thumbnails'] += 1
+            stats['bytes'] += size
+            if not dry_run:
+                storage.delete(name)
+
+
+def collect_originals(stats, batch_size=BATCH_SIZE, grace=GRACE,
+                      dry_run=False):
+    """
+    Файлы картинок постов, на которые не ссылается ни один пост, и
+    брошенные временные файлы незавершённой записи.
+    """
+    storage = _image_storage()
+    deadline = time.time() - grace
+    directory = Post._meta.get_field('image').upload_to
+    for batch in _batches(_files(storage, directory), batch_size):
+        referenced = _referenced(name for name, _, _ in batch)
+        for name, size, mtime in batch:
+            if name in referenced or mtime > deadline:
+                continue
+            stats['originals'] += 1
+            stats['bytes'] += size
+            if dry_run:
+                continue
+            if name.endswith('.part'):
+                storage.delete(name)
+            else:
+                # удаляет и миниатюры, заново проверив ссылки
+                blobs.delete_unused(name)
+    unused = MediaBlob.objects.filter(refs=0).values_list('pk', flat=True)
+    for batch in _batches(unused.iterator(), batch_size):
+        stats['entries'] += len(batch)
+        if not dry_run:
+            for name in batch:
+                blobs.delete_unused(name)
+
+
+def collect(batch_size=BATCH_SIZE, grace=GRACE, dry_run=False):
+    """
+    Удалить всё ненужное. Возвращает `Counter`: удалённые картинки
+    (`originals`), миниатюры (`thumbnails`), записи (`entries`),
+    освобождённые байты (`bytes`) и время работы в секундах
+    (`seconds`).
+    """
+    started = time.monotonic()
+    stats = Counter()
+    collect_sources(stats, batch_size, dry_run)
+    collect_thumbnail_lists(stats, batch_size, dry_run)
+    collect_thumbnail_files(stats, batch_size, grace, dry_run)
+    collect_originals(stats, batch_size, grace, dry_run)
+    stats['seconds'] = time.monotonic() - started
+    return stats
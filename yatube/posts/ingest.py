@@ -0,0 +1,127 @@
+"""
+Приём картинок постов.
+
+Загрузки пишутся во временный файл на диске (`FILE_UPLOAD_HANDLERS`), а
+не в память. До декодирования по заголовку проверяются размер файла
+и число пикселей, чтобы «бомба» из маленького файла с огромным
+разрешением не занимала гигабайты памяти. JPEG декодируется сразу
+в уменьшенном масштабе, остальные форматы — целиком, поэтому для них
+предел числа пикселей ниже (`settings.IMAGE_MAX_DECODED_PIXELS`).
+Картинки больше
+`settings.IMAGE_MAX_SIDE` по длинной стороне или повёрнутые тегом EXIF
+Orientation пересохраняются: поворот применяется, длинная сторона
+уменьшается. Поэтому хранимый оригинал ограничен, и построение
+миниатюр (см. `posts.thumbnails`) занимает предсказуемо памяти и
+времени. Остальные картинки сохраняются как есть.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+ORIENTATION = 0x0112  # тег EXIF с поворотом снимка
+# Форматы, в которых уменьшенная картинка сохраняется как была;
+# остальные (например, GIF) сохраняются в PNG
+KEPT_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+JPEG_QUALITY = 90
+# Форматы, которые Pillow умеет декодировать в уменьшенном масштабе
+# (Image.draft)
+DRAFT_FORMATS = {'JPEG'}
+
+
+def _open(upload):
+    # Image.open читает только заголовок: пиксели не декодируются
+    upload.seek(0)
+    try:
+        return Image.open(upload)
+    except Image.DecompressionBombError:
+        raise _too_many_pixels(settings.IMAGE_MAX_PIXELS)
+    except Exception:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+
+
+def _too_many_pixels(limit):
+    return ValidationError(
+        'Слишком большое разрешение картинки: не больше %(limit)s '
+        'мегапикселей.',
+        code='too_many_pixels',
+        params={'limit': limit // 10 ** 6},
+    )
+
+
+def _max_pixels(image):
+    # картинку без draft пересохранение распакует в полном размере
+    if image.format in DRAFT_FORMATS:
+        return settings.IMAGE_MAX_PIXELS
+    return min(settings.IMAGE_MAX_PIXELS, settings.IMAGE_MAX_DECODED_PIXELS)
+
+
+def _orientation(image):
+    try:
+        return image.getexif().get(ORIENTATION, 1)
+    except Exception:
+        # повреждённый EXIF не мешает показать картинку
+        return 1
+
+
+def _resave(upload, image):
+    image_format = image.format if image.format in KEPT_FORMATS else 'PNG'
+    max_side = settings.IMAGE_MAX_SIDE
+    # JPEG декодируется сразу в уменьшенном масштабе (DCT scaling)
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    options = {}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options = {'quality': JPEG_QUALITY, 'optimize': True}
+    name = '{}.{}'.format(
+        os.path.splitext(os.path.basename(upload.name))[0],
+        KEPT_FORMATS.get(image_format, 'png'),
+    )
+    # безымянный временный файл: хранилище копирует его по частям,
+    # а после закрытия он удаляется сам
+    result = File(
+        tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR), name
+    )
+    image.save(result, image_format, **options)
+    result.seek(0)
+    return result
+
+
+def ingest_image(upload):
+    """
+    Проверить загруженную картинку и вернуть файл для сохранения:
+    саму загрузку или уменьшенную и повёрнутую копию.
+    """
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            'Файл слишком большой: не больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)},
+        )
+    image = _open(upload)
+    width, height = image.size
+    limit = _max_pixels(image)
+    if width * height > limit:
+        raise _too_many_pixels(limit)
+    if (
+        max(width, height) <= settings.IMAGE_MAX_SIDE
+        and _orientation(image) == 1
+    ):
+        upload.seek(0)
+        return upload
+    try:
+        return _resave(upload, image)
+    except (OSError, SyntaxError, ValueError):
+        # заголовок в порядке, но данные картинки повреждены
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
@@ -0,0 +1,94 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from posts import counters, feed
+from posts.models import Follow, Post
+from posts.pagination import CursorPaginator
+from posts.views import SELECT_LIMIT
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость публикации поста и чтения ленты подписок '
+        'при чистом fan-out (push) и гибридной схеме (pull для популярных '
+        'авторов) в зависимости от числа подписчиков. Все данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers',
+            default='10,100,1000,10000',
+            help='Список количеств подписчиков через запятую.'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['followers'].split(',')]
+        self.stdout.write(
+            f'{"подписчиков":>12} {"схема":>7} '
+            f'{"запись, мс":>11} {"запросов":>9} '
+            f'{"чтение, мс":>11} {"запросов":>9}'
+        )
+        for size in sizes:
+            # push: порог выше числа подписчиков, автор обычный;
+            # pull: автор считается популярным
+            for mode, threshold in (('push', size + 1), ('pull', 1)):
+                write, read = self.measure(size, threshold)
+                self.stdout.write(
+                    f'{size:>12} {mode:>7} '
+                    f'{write[0]:>11.2f} {write[1]:>9} '
+                    f'{read[0]:>11.2f} {read[1]:>9}'
+                )
+
+    def timed(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+        return result, (elapsed, len(queries))
+
+    def measure(self, size, threshold):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        with transaction.atomic():
+            author = User.objects.create_user(f'{prefix}-author')
+            User.objects.bulk_create(
+                User(username=f'{prefix}-{i}') for i in range(size)
+            )
+            reader_ids = list(
+                User.objects.filter(username__startswith=f'{prefix}-')
+                .exclude(pk=author.pk).values_list('pk', flat=True)
+            )
+            Follow.objects.bulk_create(
+                Follow(user_id=reader_id, author=author)
+                for reader_id in reader_ids
+            )
+            # bulk_create обходит сигналы, счётчики автора пересчитываем
+            counters.rebuild_users([author.pk])
+            reader = User.objects.get(pk=reader_ids[0])
+            with override_settings(FEED_CELEBRITY_FOLLOWERS=threshold):
+                _, write = self.timed(
+                    lambda: Post.objects.create(author=author, text=prefix)
+                )
+                _, read = self.timed(
+                    lambda: list(CursorPaginator(
+                        feed.feed_for(reader),
+                        SELECT_LIMIT,
+                        count=lambda: counters.feed_count(reader.pk),
+                    ).page(1))
+                )
+            transaction.set_rollback(True)
+        # после отката идентификаторы могут быть выданы снова
+        cache.delete_many([
+            counters.TOTAL_KEY,
+            counters.author_key(author.pk),
+            counters.follower_key(author.pk),
+        ])
+        return write, read
@@ -0,0 +1,116 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from posts import search
+from posts.models import Post
+from posts.pagination import CursorPaginator
+from posts.views import SELECT_LIMIT
+
+User = get_user_model()
+
+# Словоформы, из которых собираются тексты постов: поиск по основе
+# должен находить все формы слова, а LIKE — только совпадающую строку.
+WORDS = [
+    ('кот', 'кота', 'коту', 'котом', 'коты', 'котов'),
+    ('город', 'города', 'городе', 'городом', 'городов'),
+    ('новость', 'новости', 'новостью', 'новостей', 'новостями'),
+    ('программа', 'программы', 'программе', 'программу', 'программами'),
+    ('красивый', 'красивая', 'красивое', 'красивые', 'красивого'),
+    ('читать', 'читаю', 'читает', 'читали', 'читающий'),
+    ('дорога', 'дороги', 'дороге', 'дорогу', 'дорогами'),
+    ('утро', 'утра', 'утром', 'утрам'),
+    ('книга', 'книги', 'книге', 'книгу', 'книгами'),
+    ('писать', 'пишу', 'пишет', 'писали', 'написанный'),
+]
+FILLER = ['и', 'в', 'на', 'с', 'по', 'о', 'за', 'не', 'что', 'это']
+WORDS_IN_POST = 30
+QUERIES = ['кот', 'новости города', 'красивые книги', 'программами']
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по постам через LIKE и через полнотекстовый '
+        'индекс FTS5 на сгенерированных постах. Все данные создаются в '
+        'транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=1000000,
+            help='Сколько постов сгенерировать.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько постов вставлять за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite')
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.generate(options['posts'], options['batch_size'])
+            self.stdout.write(
+                f'Создано постов: {options["posts"]} '
+                f'за {time.perf_counter() - started:.1f} с'
+            )
+            self.stdout.write(
+                f'{"запрос":>16} {"LIKE, мс":>10} {"найдено":>8} '
+                f'{"FTS5, мс":>10} {"найдено":>8} {"запросов":>9}'
+            )
+            for query in QUERIES:
+                like, like_count, _ = self.timed(lambda: self.like(query))
+                fts, fts_count, queries = self.timed(lambda: self.fts(query))
+                self.stdout.write(
+                    f'{query:>16} {like:>10.2f} {like_count:>8} '
+                    f'{fts:>10.2f} {fts_count:>8} {queries:>9}'
+                )
+            transaction.set_rollback(True)
+
+    def generate(self, total, batch_size):
+        author = User.objects.create_user(f'bench-{uuid.uuid4().hex[:8]}')
+        vocabulary = [form for forms in WORDS for form in forms] + FILLER
+        while total > 0:
+            size = min(batch_size, total)
+            total -= size
+            posts = Post.objects.bulk_create(
+                Post(
+                    author=author,
+                    text=' '.join(random.choices(vocabulary, k=WORDS_IN_POST))
+                )
+                for _ in range(size)
+            )
+            # bulk_create обходит сигналы, индекс заполняем сами
+            search.index_posts((post.pk, post.text) for post in posts)
+
+    def timed(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            count = func()
+            elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, count, len(queries)
+
+    def like(self, query):
+        # Так искала админка: каждое слово — LIKE '%...%' по всей таблице
+        posts = Post.objects.all()
+        for word in query.split():
+            posts = posts.filter(text__icontains=word)
+        list(posts.order_by('-pub_date')[:SELECT_LIMIT])
+        return posts.count()
+
+    def fts(self, query):
+        paginator = CursorPaginator(
+            search.find(query), SELECT_LIMIT, keys=search.KEYS
+        )
+        list(paginator.page(1))
+        return paginator.count
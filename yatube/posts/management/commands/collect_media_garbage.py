@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+from posts import garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, миниатюры и записи о них, которые '
+        'больше не нужны. Просматривает файлы и записи пачками, поэтому '
+        'подходит для запуска на работающем сайте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=garbage.BATCH_SIZE,
+            help='Сколько файлов или записей проверять за один запрос.'
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=garbage.GRACE,
+            help='Не удалять файлы моложе стольких секунд.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default.kvstore, KVStore):
+            raise CommandError(
+                'Сборка поддерживает только хранилище sorl-thumbnail '
+                'cached_db_kvstore.'
+            )
+        stats = garbage.collect(
+            batch_size=options['batch_size'],
+            grace=options['grace'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            removed, freed = 'Будет удалено', 'Будет освобождено'
+        else:
+            removed, freed = 'Удалено', 'Освобождено'
+        self.stdout.write(
+            f'{removed}: картинок {stats["originals"]}, '
+            f'миниатюр {stats["thumbnails"]}, записей {stats["entries"]}'
+        )
+        self.stdout.write(
+            f'{freed}: {filesizeformat(stats["bytes"])} '
+            f'за {stats["seconds"]:.2f} с'
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает по базе счётчики постов, комментариев и подписок '
+        'и сбрасывает их кэш. Запускается после расхождения счётчиков '
+        'или периодически.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько объектов пересчитывать за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = counters.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Пересчитано пользователей: {rebuilt["users"]}, '
+            f'групп: {rebuilt["groups"]}, постов: {rebuilt["posts"]} '
+            f'за {time.monotonic() - started:.2f} с'
+        )
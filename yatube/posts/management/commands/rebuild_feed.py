@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает в ленты подписчиков посты авторов ниже порога '
+        'популярности, если разложено не всё. Запускается после смены '
+        'FEED_CELEBRITY_FOLLOWERS или расхождения счётчиков.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = feed.rebuild()
+        self.stdout.write(
+            f'Разложено заново авторов: {rebuilt} '
+            f'за {time.monotonic() - started:.2f} с'
+        )
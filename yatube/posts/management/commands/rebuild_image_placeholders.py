@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import placeholders
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново считает основной цвет и превью картинок постов. '
+        'Запускается после миграции, добавившей эти поля, и после '
+        'замены файлов картинок в обход сигналов.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        described = placeholders.rebuild()
+        self.stdout.write(
+            f'Обработано картинок: {described} '
+            f'за {time.monotonic() - started:.2f} с'
+        )
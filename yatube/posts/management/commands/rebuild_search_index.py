@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов. Запускается после '
+        'массовых изменений постов в обход сигналов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=search.BATCH_SIZE,
+            help='Сколько постов индексировать за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Проиндексировано постов: {indexed} '
+            f'за {time.monotonic() - started:.2f} с'
+        )
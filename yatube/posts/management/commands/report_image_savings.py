@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько байт экономят миниатюры разной ширины и '
+        'современных форматов по сравнению с одной миниатюрой полной '
+        'ширины в исходном формате, которую раньше получали все '
+        'устройства. Учитываются только уже построенные миниатюры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Для скольких постов искать миниатюры за одно обращение.'
+        )
+
+    def handle(self, *args, **options):
+        # вариант -> ширина -> [было, стало]
+        totals = {variant: {} for variant in thumbnails.VARIANTS}
+        missing = 0
+        posts = Post.objects.exclude(image='').only('id', 'image')
+        batch = []
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            batch.append(post)
+            if len(batch) == options['batch_size']:
+                missing += self.count(batch, totals)
+                batch = []
+        missing += self.count(batch, totals)
+        self.stdout.write(
+            f'{"вариант":>8} {"ширина":>7} {"было, байт":>12} '
+            f'{"стало, байт":>12} {"экономия":>9}'
+        )
+        before_all = after_all = 0
+        for variant, widths in totals.items():
+            for width, (before, after) in sorted(widths.items()):
+                before_all += before
+                after_all += after
+                self.stdout.write(
+                    f'{variant:>8} {width:>7} {before:>12} {after:>12} '
+                    f'{self.percent(before, after):>8.1f}%'
+                )
+        self.stdout.write(
+            f'Всего сэкономлено байт: {before_all - after_all} '
+            f'({self.percent(before_all, after_all):.1f}%)'
+        )
+        if missing:
+            self.stdout.write(
+                f'Пропущено картинок без готовых миниатюр '
+                f'(по всем вариантам): {missing}'
+            )
+
+    def percent(self, before, after):
+        return (before - after) * 100 / before if before else 0.0
+
+    def count(self, posts, totals):
+        """Добавить размеры миниатюр постов к итогам; вернуть пропуски."""
+        missing = 0
+        for variant in thumbnails.VARIANTS:
+            pictures = thumbnails.ready_pictures(
+                [post.image for post in posts], variant
+            )
+            missing += len(posts) - len(pictures)
+            for picture in pictures.values():
+                sizes = thumbnails.file_sizes(picture)
+                full = sizes.get((None, picture.full_width))
+                if full is None:
+                    missing += 1
+                    continue
+                best = {}
+                for (_, width), size in sizes.items():
+                    best[width] = min(size, best.get(width, size))
+                for width, size in best.items():
+                    total = totals[variant].setdefault(width, [0, 0])
+                    total[0] += full
+                    total[1] += size
+        return missing
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+TABLE = 'posts_post_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # Таблица создаётся пустой: существующие посты индексирует
+    # `manage.py rebuild_search_index` текущим кодом posts.stemming,
+    # а не его копией на момент миграции.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+        f"text, tokenize='unicode61 remove_diacritics 0')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:03
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_refs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    refs = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(refs=Count('pk')).values_list('image', 'refs')
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refs=count) for name, count in refs],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_refs, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.querycache import CachingManager
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -10,6 +13,13 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название')
     slug = models.SlugField(unique=True)
     description = models.TextField(verbose_name='Описание')
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов'
+    )
+
+    objects = CachingManager()
 
     def __str__(self):
         return self.title
@@ -47,16 +57,62 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        # по имени файла ищутся посты, которые на него ссылаются
+        db_index=True
+    )
+    # Сведения о картинке для вывода без чтения файла (posts.placeholders).
+    image_color = models.CharField(
+        max_length=7,
+        blank=True,
+        editable=False,
+        verbose_name='Основной цвет картинки'
+    )
+    image_placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Превью картинки'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
     )
 
+    objects = CachingManager()
+
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # счётчики обновляются сигналами в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Сообщения'
         verbose_name_plural = 'Сообщения'
+        # индексы под ленты: главная, профиль автора и страница группы
+        # выбираются по ключу (pub_date, id) без сортировки
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def get_absolute_url(self):
         return reverse("post", kwargs={"post_id": self.pk})
@@ -86,10 +142,22 @@ class Comment(models.Model):
         verbose_name='Дата публикации'
     )
 
+    objects = CachingManager()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 # Объявляем модель Follow, отвечающую за подписки
@@ -105,6 +173,12 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    objects = CachingManager()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -113,3 +187,98 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_author_user_following'
             )
         ]
+        # подписчики автора читаются прямо из индекса
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+# Объявляем модель UserCounter, хранящую счётчики пользователя:
+# модель пользователя встроенная, поэтому поля вынесены в отдельную таблицу
+class UserCounter(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+# Объявляем модель FeedEntry, материализованную ленту подписок:
+# запись появляется у каждого подписчика при публикации поста
+# и при подписке на автора, удаляется при отписке.
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'
+            ),
+        ]
+
+
+# Объявляем модель MediaBlob: файл картинки в хранилище по содержимому
+# и количество постов, которые на него ссылаются (см. posts.blobs)
+class MediaBlob(models.Model):
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Файл'
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество ссылок'
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
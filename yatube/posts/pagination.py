@@ -0,0 +1,286 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+PAGE_WINDOW = 2  # сколько номеров страниц показывать по сторонам от текущей
+# глубже номера страниц не открываются (OFFSET растёт с номером),
+# дальше ведут только курсоры
+MAX_PAGE_NUMBER = 5
+ESTIMATE_THRESHOLD = 10000  # меньшие таблицы считаются точно
+NEXT = 'n'  # курсор ведёт на следующую (более старую) страницу
+PREVIOUS = 'p'  # курсор ведёт на предыдущую (более новую) страницу
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class DeepPage(EmptyPage):
+    """Номер страницы глубже `max_page`."""
+
+
+def keyset_filter(keys, values, lookup):
+    """
+    Условие "ключ строго меньше (lookup='lt') или больше (lookup='gt')
+    значений" для составного ключа:
+    (k1, k2) < (v1, v2)  <=>  k1 < v1 OR (k1 = v1 AND k2 < v2).
+    """
+    condition = Q()
+    for position, key in enumerate(keys):
+        equal = {keys[i]: values[i] for i in range(position)}
+        equal[f'{key}__{lookup}'] = values[position]
+        condition |= Q(**equal)
+    return condition
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсор должен
+    # воспроизводить значение ключа точно.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в курсор')
+
+
+class CursorPaginator(Paginator):
+    """
+    Паджинатор ленты по ключу (pub_date, id).
+
+    Страницу отдаёт по непрозрачному курсору: запрос строится как
+    `WHERE (pub_date, id) < (...) ORDER BY -pub_date, -id LIMIT n + 1`,
+    поэтому время выборки не зависит от глубины страницы и не требует
+    COUNT(*) по всей таблице. Номерами открываются только первые
+    `max_page` страниц.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 count=None, max_page=MAX_PAGE_NUMBER, **kwargs):
+        self.keys = tuple(keys)
+        self.max_page = max_page
+        # count — функция, возвращающая заранее известное количество
+        # объектов (см. `posts.counters`), вместо COUNT(*) по выборке
+        self._count = count
+        object_list = object_list.order_by(*('-' + key for key in self.keys))
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self._count is not None:
+            return self._count()
+        return super().count
+
+    def validate_number(self, number):
+        number = super().validate_number(number)
+        if number > self.max_page:
+            raise DeepPage('Глубже страницы открываются только по курсору')
+        return number
+
+    def get_page(self, number):
+        """
+        Как `Paginator.get_page`, но номер глубже `max_page` не
+        открывается (DeepPage), а вместо него нет и последней страницы.
+        """
+        try:
+            number = self.validate_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except DeepPage:
+            raise
+        except EmptyPage:
+            number = min(self.num_pages, self.max_page)
+        return self.page(number)
+
+    def page(self, number):
+        # Счётчик из кэша может ненадолго отставать от базы, поэтому
+        # срез не обрезается по нему: лишние записи просто не найдутся.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top += self.orphans
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+    def page_window(self, number, on_each_side=PAGE_WINDOW):
+        """
+        Номера страниц вокруг текущей, не глубже `max_page`, и первая.
+        Пропуск обозначается `None`.
+        """
+        window = range(
+            max(number - on_each_side, 1),
+            min(number + on_each_side, self.num_pages, self.max_page) + 1
+        )
+        pages = []
+        if window[0] > 1:
+            pages.append(1)
+            if window[0] > 2:
+                pages.append(None)
+        pages.extend(window)
+        return pages
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, key) for key in self.keys]
+        payload = json.dumps(
+            {'d': direction, 'v': values},
+            default=_encode_value,
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(
+            payload.encode()
+        ).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            direction, values = payload['d'], payload['v']
+            if direction not in (NEXT, PREVIOUS):
+                raise InvalidCursor(cursor)
+            if len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            values = [
+                self._key_value(key, value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, KeyError,
+                ValidationError) as error:
+            raise InvalidCursor(cursor) from error
+        return direction, values
+
+    def _key_value(self, key, value):
+        # Ключ может быть не полем модели, а вычисляемым числом
+        # (например, релевантность в `posts.search`).
+        try:
+            field = self.object_list.model._meta.get_field(key)
+        except FieldDoesNotExist:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise InvalidCursor(value)
+            return value
+        return field.to_python(value)
+
+    def _seek(self, values, lookup):
+        # Выборка, не являющаяся QuerySet (например, `feed.HybridFeed`),
+        # сдвигается по ключу сама.
+        seek = getattr(self.object_list, 'seek', None)
+        if seek is not None:
+            return seek(values, lookup)
+        return self.object_list.filter(
+            keyset_filter(self.keys, values, lookup)
+        )
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.object_list = list(page.object_list)
+        page.cursor_mode = False
+        page.cache_key = f'page:{page.number}'
+        page.page_window = self.page_window(page.number)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if page.object_list:
+            if page.has_next():
+                page.next_cursor = self.encode_cursor(
+                    page.object_list[-1], NEXT
+                )
+            if page.has_previous():
+                page.previous_cursor = self.encode_cursor(
+                    page.object_list[0], PREVIOUS
+                )
+        return page
+
+    def cursor_page(self, cursor):
+        """Вернуть страницу, начинающуюся сразу за курсором."""
+        direction, values = self.decode_cursor(cursor)
+        if direction == NEXT:
+            queryset = self._seek(values, 'lt')
+        else:
+            queryset = self._seek(values, 'gt').reverse()
+        # Лишняя запись показывает, есть ли страницы дальше по направлению.
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == PREVIOUS:
+            object_list.reverse()
+        page = Page(object_list, None, self)
+        page.cursor_mode = True
+        page.cache_key = f'cursor:{cursor}'
+        page.next_cursor = None
+        page.previous_cursor = None
+        if object_list:
+            if direction == PREVIOUS or has_more:
+                page.next_cursor = self.encode_cursor(object_list[-1], NEXT)
+            if direction == NEXT or has_more:
+                page.previous_cursor = self.encode_cursor(
+                    object_list[0], PREVIOUS
+                )
+        return page
+
+    def get_cursor_page(self, cursor):
+        """
+        Вернуть страницу по курсору, а при повреждённом курсоре или
+        пустой выборке — первую страницу.
+        """
+        try:
+            page = self.cursor_page(cursor)
+        except InvalidCursor:
+            return self.get_page(1)
+        if not page.object_list:
+            return self.get_page(1)
+        return page
+
+
+def estimated_count(queryset):
+    """
+    Примерное число строк таблицы без COUNT(*): из статистики
+    планировщика (PostgreSQL — pg_class, SQLite — sqlite_stat1 после
+    ANALYZE), а без неё — по наибольшему первичному ключу. Возвращает
+    None, если оценку получить нельзя.
+    """
+    opts = queryset.model._meta
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE relname = %s',
+                    [opts.db_table]
+                )
+                row = cursor.fetchone()
+                if row and row[0] > 0:
+                    return row[0]
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [opts.db_table]
+                )
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+        except DatabaseError:
+            # статистика ещё не собиралась
+            pass
+    return queryset.model._default_manager.using(queryset.db).aggregate(
+        last=Max('pk')
+    )['last']
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Паджинатор списков админки. Для выборки без условий по большой
+    таблице количество берётся из оценки `estimated_count`, а не из
+    COUNT(*), который читает таблицу целиком. Отфильтрованные выборки
+    и небольшие таблицы считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,101 @@
+"""
+Сведения о картинке поста, которые шаблоны выводят без чтения файла.
+
+При сохранении поста с новой картинкой в модель записываются её
+основной цвет и крошечное размытое превью (LQIP, JPEG шириной
+`PREVIEW_SIDE` пикселей в data: URI). Пока картинка грузится, на её
+месте виден цвет и превью. Место под картинку резервируют размеры
+варианта миниатюры (`thumbnails.VARIANTS`): миниатюры обрезаются
+точно по ним, поэтому размеры исходной картинки не нужны.
+"""
+import base64
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from PIL import Image
+
+from .models import Post
+
+SAMPLE_SIDE = 64  # до какого размера уменьшать картинку для анализа
+PREVIEW_SIDE = 16  # длинная сторона превью, пиксели
+PREVIEW_QUALITY = 60
+PALETTE_SIZE = 5  # среди скольких цветов выбирать основной
+
+EMPTY = {
+    'image_color': '',
+    'image_placeholder': '',
+}
+
+
+def dominant_color(image):
+    """Самый частый цвет уменьшенной палитры картинки в виде #rrggbb."""
+    quantized = image.quantize(colors=PALETTE_SIZE)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def preview(image):
+    small = image.copy()
+    small.thumbnail((PREVIEW_SIDE, PREVIEW_SIDE))
+    buffer = BytesIO()
+    small.save(buffer, 'JPEG', quality=PREVIEW_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def describe(file):
+    """
+    Поля модели с цветом и превью картинки из открытого
+    файла. Если картинку прочитать не удалось, поля пустые.
+    """
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            # JPEG декодируется сразу в уменьшенном масштабе
+            image.draft('RGB', (SAMPLE_SIDE, SAMPLE_SIDE))
+            sample = image.convert('RGB')
+        sample.thumbnail((SAMPLE_SIDE, SAMPLE_SIDE))
+        return {
+            'image_color': dominant_color(sample),
+            'image_placeholder': preview(sample),
+        }
+    except (OSError, SyntaxError, ValueError):
+        return dict(EMPTY)
+    finally:
+        file.seek(0)
+
+
+def describe_image(image):
+    """
+    То же для FieldFile: ещё не сохранённая загрузка читается из
+    памяти или временного файла, сохранённая — из хранилища.
+    """
+    if not image:
+        return dict(EMPTY)
+    if not image._committed:
+        return describe(image.file)
+    try:
+        file = image.storage.open(image.name, 'rb')
+    except (OSError, ValueError, SuspiciousFileOperation):
+        # файла нет или путь ведёт за пределы хранилища
+        return dict(EMPTY)
+    with file:
+        return describe(file)
+
+
+def rebuild():
+    """
+    Заново посчитать цвет и превью картинок всех постов. Возвращает
+    количество картинок.
+    """
+    # одна картинка может принадлежать нескольким постам
+    names = Post.objects.exclude(image='').order_by('image').values_list(
+        'image', flat=True
+    ).distinct()
+    described = 0
+    for name in names.iterator():
+        image = Post(image=name).image
+        Post.objects.filter(image=name).update(**describe_image(image))
+        described += 1
+    return described
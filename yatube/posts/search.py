@@ -0,0 +1,194 @@
+"""
+Полнотекстовый поиск по постам.
+
+В SQLite тексты постов индексируются в таблице FTS5 `posts_post_fts`
+(rowid совпадает с id поста). В индекс попадают основы слов (см.
+`posts.stemming`), поэтому «котов» находит «кот» и «коты». Индекс
+обновляют сигналы при сохранении и удалении поста; после миграции,
+которая создаёт индекс пустым, и после массовых изменений в обход
+сигналов его перестраивает команда `manage.py rebuild_search_index`.
+
+Результаты ранжируются по bm25: ключ (relevance, id), где
+relevance = -bm25, поэтому `CursorPaginator` листает их курсорами так
+же, как ленты. На других СУБД поиск сводится к LIKE без ранжирования.
+"""
+from django.db import connection
+from django.db.models import FloatField, Value
+
+from .models import Post
+from .stemming import stems
+
+TABLE = 'posts_post_fts'
+KEYS = ('relevance', 'id')  # ключ сортировки результатов поиска
+BATCH_SIZE = 1000  # сколько постов индексировать за один запрос
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def indexed_text(text):
+    return ' '.join(stems(text))
+
+
+def match_expression(query):
+    """
+    Запрос FTS5 из пользовательской строки: все основы слов должны
+    встретиться в тексте. Каждая основа берётся в кавычки, так что
+    синтаксис FTS5 в строке не интерпретируется.
+    """
+    return ' '.join(
+        '"{}"'.format(word.replace('"', '""')) for word in stems(query)
+    )
+
+
+def index_posts(posts):
+    """Добавить в индекс или обновить пары (id, текст)."""
+    rows = [(pk, indexed_text(text)) for pk, text in posts]
+    if not rows or not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk, _ in rows]
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', rows
+        )
+
+
+def unindex_post(post_id):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Перестроить индекс по всем постам. Возвращает их количество."""
+    if not enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    indexed = 0
+    batch = []
+    posts = Post.objects.order_by('pk').values_list('pk', 'text')
+    for post in posts.iterator(chunk_size=batch_size):
+        batch.append(post)
+        if len(batch) == batch_size:
+            index_posts(batch)
+            indexed += len(batch)
+            batch = []
+    index_posts(batch)
+    return indexed + len(batch)
+
+
+def matching(queryset, query):
+    """Ограничить выборку постами, подходящими под запрос."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not enabled():
+        return queryset.filter(text__icontains=query)
+    # RawSQL в `pk__in` оборачивается в лишние скобки, и SQLite
+    # сравнивает id только с первой строкой подзапроса.
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN '
+            f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'
+        ],
+        params=[expression],
+    )
+
+
+class SearchResults:
+    """
+    Найденные посты в порядке убывания релевантности.
+
+    Как и `feed.HybridFeed`, поддерживает то, что нужно
+    `CursorPaginator`: порядок по ключу (relevance, id), сдвиг по ключу,
+    разворот, срезы и количество.
+    """
+
+    model = Post
+    ordered = True
+
+    def __init__(self, expression, seek=None, ascending=False):
+        self.expression = expression
+        self._seek = seek
+        self._ascending = ascending
+
+    def order_by(self, *fields):
+        return self
+
+    def reverse(self):
+        return SearchResults(self.expression, self._seek, not self._ascending)
+
+    def seek(self, values, lookup):
+        return SearchResults(
+            self.expression, (values, lookup), self._ascending
+        )
+
+    def _ranked(self, offset, limit):
+        direction = 'ASC' if self._ascending else 'DESC'
+        sql = (
+            f'SELECT id, relevance FROM ('
+            f'SELECT rowid AS id, -bm25({TABLE}) AS relevance '
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s)'
+        )
+        params = [self.expression]
+        if self._seek is not None:
+            values, lookup = self._seek
+            operator = '<' if lookup == 'lt' else '>'
+            sql += (
+                f' WHERE relevance {operator} %s'
+                f' OR (relevance = %s AND id {operator} %s)'
+            )
+            params += [values[0], values[0], values[1]]
+        sql += (
+            f' ORDER BY relevance {direction}, id {direction}'
+            f' LIMIT %s OFFSET %s'
+        )
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        ranked = self._ranked(start, index.stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in ranked]
+        )
+        found = []
+        for pk, relevance in ranked:
+            # пост мог быть удалён в обход сигналов
+            if pk in posts:
+                posts[pk].relevance = relevance
+                found.append(posts[pk])
+        return found
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+
+def find(query):
+    """
+    Посты, подходящие под запрос, для `CursorPaginator` с ключом `KEYS`.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return Post.objects.none().annotate(
+            relevance=Value(0.0, output_field=FloatField())
+        )
+    if enabled():
+        return SearchResults(expression)
+    return Post.objects.filter(text__icontains=query).select_related(
+        'author', 'group'
+    ).annotate(relevance=Value(0.0, output_field=FloatField()))
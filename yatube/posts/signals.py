@@ -0,0 +1,290 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from core import fragments, pagecache
+
+from . import blobs, counters, feed, placeholders, search, thumbnails
+from .conditional import (
+    POSTS_NAMESPACE, author_card_namespace, author_namespace,
+    follow_namespace, group_namespace, post_namespace
+)
+from .models import Comment, Follow, Group, Post, User
+from .surrogates import (
+    POSTS_KEY, author_key, author_posts_key, byline_key, group_key,
+    group_keys, post_key
+)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    # При редактировании пост может перейти в другую группу, запоминаем
+    # прежнюю, чтобы поправить счётчики обеих групп, и прежнюю
+    # картинку, чтобы строить миниатюры только для новой.
+    if instance._state.adding:
+        return
+    previous = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'image'
+    ).first()
+    if previous is not None:
+        instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(pre_save, sender=Post)
+def remember_image_upload(sender, instance, raw=False, **kwargs):
+    # Содержимое новой картинки нужно, если файл с тем же хэшем удалят,
+    # пока пост сохраняется (см. `blobs.acquire`).
+    image = instance.image
+    instance._image_upload = (
+        image.file if not raw and image and not image._committed else None
+    )
+
+
+@receiver(pre_save, sender=Post)
+def describe_post_image(sender, instance, raw=False, **kwargs):
+    # Размеры, цвет и превью считаются один раз, когда картинка меняется.
+    if raw:
+        return
+    image = instance.image
+    if image._committed and image.name == getattr(
+        instance, '_previous_image', None
+    ):
+        return
+    for field, value in placeholders.describe_image(image).items():
+        setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.post_added(instance)
+        feed.push_post(instance)
+        return
+    previous_group_id = getattr(
+        instance, '_previous_group_id', instance.group_id
+    )
+    if previous_group_id != instance.group_id:
+        counters.post_moved(previous_group_id, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.post_removed(instance)
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_count(sender, instance, **kwargs):
+    counters.group_removed(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_user_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.user_added(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.follow_added(instance)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+    feed.author_unfollowed(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump(
+            POSTS_NAMESPACE,
+            post_namespace(instance.pk),
+            author_namespace(instance.author_id),
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_group_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump(POSTS_NAMESPACE, group_namespace(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def expire_author_fragments(sender, instance, created, update_fields=None,
+                            raw=False, **kwargs):
+    # Карточки постов выводят имя автора: версия подписи входит в их
+    # ключ. Вход на сайт сохраняет только last_login и фрагменты не
+    # затрагивает.
+    if raw or created or update_fields == frozenset({'last_login'}):
+        return
+    fragments.bump(
+        POSTS_NAMESPACE,
+        author_namespace(instance.pk),
+        author_card_namespace(instance.pk),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump(post_namespace(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump(
+            follow_namespace(instance.user_id),
+            author_namespace(instance.author_id),
+            author_namespace(instance.user_id),
+        )
+
+
+@receiver(post_save, sender=Post)
+def purge_post_pages(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        pagecache.purge(
+            POSTS_KEY,
+            post_key(instance.pk),
+            author_key(instance.author_id),
+            author_posts_key(instance.author_id),
+            *group_keys(instance.group_id),
+        )
+        return
+    # Правка меняет только карточку поста, переход в другую группу —
+    # ещё и состав лент обеих групп.
+    keys = [post_key(instance.pk)]
+    previous_group_id = getattr(
+        instance, '_previous_group_id', instance.group_id
+    )
+    if previous_group_id != instance.group_id:
+        keys += group_keys(previous_group_id, instance.group_id)
+    pagecache.purge(*keys)
+
+
+@receiver(post_delete, sender=Post)
+def purge_deleted_post_pages(sender, instance, **kwargs):
+    pagecache.purge(
+        POSTS_KEY,
+        post_key(instance.pk),
+        author_key(instance.author_id),
+        author_posts_key(instance.author_id),
+        *group_keys(instance.group_id),
+    )
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def purge_group_pages(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # ключ группы стоит и на страницах её постов
+    keys = [group_key(instance.slug)]
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug and previous_slug != instance.slug:
+        keys.append(group_key(previous_slug))
+    pagecache.purge(*keys)
+
+
+@receiver(post_delete, sender=Group)
+def purge_deleted_group_pages(sender, instance, **kwargs):
+    pagecache.purge(group_key(instance.slug))
+
+
+@receiver(post_save, sender=User)
+def purge_author_pages(sender, instance, created, update_fields=None,
+                       raw=False, **kwargs):
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    pagecache.purge(author_key(instance.pk), byline_key(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pagecache.purge(post_key(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow_pages(sender, instance, raw=False, **kwargs):
+    # на странице профиля выводятся число подписчиков и подписок
+    if not raw:
+        pagecache.purge(
+            author_key(instance.author_id), author_key(instance.user_id)
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_posts([(instance.pk, instance.text)])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.image != getattr(
+        instance, '_previous_image', instance.image
+    ):
+        thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = '' if created else getattr(
+        instance, '_previous_image', instance.image.name
+    )
+    if previous == instance.image.name:
+        return
+    if instance.image:
+        blobs.acquire(
+            instance.image.name, getattr(instance, '_image_upload', None)
+        )
+    if previous:
+        blobs.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        blobs.release(instance.image.name)
@@ -0,0 +1,125 @@
+"""
+Стеммер русского языка по алгоритму Snowball
+(https://snowballstem.org/algorithms/russian/stemmer.html).
+
+В SQLite нет русского стеммера, поэтому полнотекстовый индекс
+(см. `posts.search`) хранит и ищет уже приведённые к основе слова.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+WORD = re.compile(r'\w+')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    (
+        'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+        'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую',
+        'юю', 'ая', 'яя', 'ою', 'ею',
+    ),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    (),
+    (
+        'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+        'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+        'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+        'ья', 'я',
+    ),
+)
+DERIVATIONAL = ((), ('ост', 'ость'))
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+
+
+def _regions(word):
+    # RV — часть слова после первой гласной; R2 — после второго
+    # сочетания «гласная + согласная».
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _remove(word, start, endings):
+    """
+    Отрезать самое длинное окончание, целиком лежащее после `start`.
+    Окончания первой группы отрезаются, только если перед ними стоит
+    «а» или «я». Возвращает слово и признак, что окончание найдено.
+    """
+    after_a, plain = endings
+    candidates = sorted(
+        [(ending, True) for ending in after_a]
+        + [(ending, False) for ending in plain],
+        key=lambda candidate: len(candidate[0]),
+        reverse=True,
+    )
+    for ending, needs_a in candidates:
+        rest = word[:-len(ending)]
+        if not word.endswith(ending) or len(rest) < start:
+            continue
+        if needs_a and not (rest.endswith(('а', 'я')) and len(rest) > start):
+            return word, False
+        return rest, True
+    return word, False
+
+
+@lru_cache(maxsize=10000)
+def stem(word):
+    """Основа слова в нижнем регистре."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    word, found = _remove(word, rv, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _remove(word, rv, REFLEXIVE)
+        word, found = _remove(word, rv, ADJECTIVE)
+        if found:
+            word, _ = _remove(word, rv, PARTICIPLE)
+        else:
+            word, found = _remove(word, rv, VERB)
+            if not found:
+                word, _ = _remove(word, rv, NOUN)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word, _ = _remove(word, r2, DERIVATIONAL)
+    word, found = _remove(word, rv, SUPERLATIVE)
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif not found and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def stems(text):
+    """Основы всех слов текста по порядку."""
+    return [stem(word) for word in WORD.findall(text)]
@@ -0,0 +1,58 @@
+"""
+Суррогатные ключи страниц для кэша `core.pagecache`.
+
+Ключ называет данные, из которых собрана страница: ключ поста —
+сам пост, его картинка и комментарии; ключ подписи автора — его имя
+и ссылка на профиль в карточках постов, на странице поста и в
+комментариях; ключ числа постов автора — счётчик на странице поста;
+ключи группы и автора — их страницы (состав ленты, заголовок
+и счётчики), ключ группы стоит и на страницах её постов;
+`POSTS_KEY` — состав главной. Сигналы (см. `posts.signals`)
+сбрасывают только ключи затронутых данных, и каждое изменение
+сбрасывает несколько ключей, а не по ключу на пост: правка поста
+сбрасывает страницы, где есть его карточка, переименование автора
+или группы — страницы с их подписью.
+"""
+from .models import Group
+
+POSTS_KEY = 'posts'  # состав главной страницы
+
+
+def post_key(post_id):
+    return f'post-{post_id}'
+
+
+def author_key(author_id):
+    return f'author-{author_id}'
+
+
+def byline_key(author_id):
+    return f'byline-{author_id}'
+
+
+def author_posts_key(author_id):
+    return f'author-posts-{author_id}'
+
+
+def group_key(slug):
+    return f'group-{slug}'
+
+
+def group_keys(*group_ids):
+    group_ids = [group_id for group_id in group_ids if group_id is not None]
+    if not group_ids:
+        return []
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    return [group_key(slug) for slug in slugs]
+
+
+def post_keys(posts):
+    return [post_key(post.pk) for post in posts]
+
+
+def byline_keys(items):
+    # подписи авторов постов или комментариев
+    author_ids = dict.fromkeys(item.author_id for item in items)
+    return [byline_key(author_id) for author_id in author_ids]
@@ -0,0 +1,12 @@
+from django import template
+
+from core import fragments
+from posts.conditional import author_card_namespace
+
+register = template.Library()
+
+
+@register.simple_tag
+def author_card_version(post):
+    """Версия подписи автора в карточке поста."""
+    return fragments.version(author_card_namespace(post.author_id))
@@ -0,0 +1,27 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, variant):
+    """
+    Готовые миниатюры картинки поста (`thumbnails.Picture`, варианты —
+    `thumbnails.VARIANTS`) или None, пока они строятся.
+    """
+    return thumbnails.post_thumbnail(post, variant)
+
+
+@register.simple_tag
+def variant_size(variant):
+    """Размер картинки варианта (ширина и высота) для разметки."""
+    return thumbnails.variant_size(variant)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, variant):
+    """Найти миниатюры всех постов страницы одним обращением."""
+    thumbnails.prefetch(posts, variant)
+    return ''
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import pagination
+from posts.models import Comment, Post
+from posts.pagination import EstimatedCountPaginator
+from .factories import post_create, group_create, clean_counter
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin_user = User.objects.create_superuser(
+            'admin', 'admin@yatube.ru', 'password'
+        )
+        cls.groups = [group_create() for i in range(5)]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        self.admin = Client()
+        self.admin.force_login(self.admin_user)
+
+    def add_rows(self, count):
+        for i in range(count):
+            author = User.objects.create_user(f'author-{Post.objects.count()}')
+            post = post_create(author, self.groups[i % len(self.groups)])
+            Comment.objects.create(post=post, author=author, text='Текст')
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_run_constant_number_of_queries(self):
+        """
+        Число запросов списков постов и комментариев не зависит от
+        количества строк.
+        """
+        for name in (
+            'admin:posts_post_changelist', 'admin:posts_comment_changelist'
+        ):
+            with self.subTest(name=name):
+                self.add_rows(2)
+                few = self.changelist_queries(name)
+                self.add_rows(10)
+                many = self.changelist_queries(name)
+                self.assertEqual(few, many)
+
+    def test_estimated_count_for_unfiltered_large_tables(self):
+        """Без фильтров большая таблица не считается через COUNT(*)."""
+        self.add_rows(3)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 100)
+        self.assertEqual(paginator.count, 3)
+        with mock.patch.object(pagination, 'ESTIMATE_THRESHOLD', 0):
+            paginator = EstimatedCountPaginator(Post.objects.all(), 100)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertGreaterEqual(paginator.count, 3)
+            self.assertFalse(
+                any('COUNT(*)' in query['sql'] for query in queries)
+            )
+            filtered = EstimatedCountPaginator(
+                Post.objects.filter(group=self.groups[0]), 100
+            )
+            self.assertEqual(filtered.count, 1)
@@ -0,0 +1,122 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow
+from .factories import post_create, group_create, clean_counter
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user('author')
+        cls.reader_user = User.objects.create_user('reader')
+        cls.group = group_create()
+        cls.post = post_create(cls.author_user, cls.group)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        self.guest = Client()
+        self.reader = Client()
+        self.reader.force_login(self.reader_user)
+        cache.clear()
+        self.pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+
+    def revalidate(self, client, url, response, **params):
+        return client.get(
+            url, params, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_unchanged_pages_not_modified(self):
+        """
+        Повторный запрос с ETag или Last-Modified получает 304, а для
+        лент проверка не обращается к базе.
+        """
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                repeated = self.revalidate(self.guest, url, response)
+                self.assertEqual(
+                    repeated.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                repeated = self.guest.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(
+                    repeated.status_code, HTTPStatus.NOT_MODIFIED
+                )
+        index = self.guest.get(self.pages[0])
+        with self.assertNumQueries(0):
+            self.revalidate(self.guest, self.pages[0], index)
+
+    def test_changes_invalidate_pages(self):
+        """Новый пост, комментарий или подписка меняют валидаторы."""
+        profile, detail = self.pages[2], self.pages[3]
+        changes = [
+            (
+                lambda: post_create(self.author_user, self.group),
+                [profile, detail]
+            ),
+            (
+                lambda: Comment.objects.create(
+                    post=self.post, author=self.reader_user,
+                    text='Комментарий'
+                ),
+                [detail]
+            ),
+            (
+                lambda: Follow.objects.create(
+                    user=self.reader_user, author=self.author_user
+                ),
+                [profile]
+            ),
+        ]
+        for change, urls in changes:
+            responses = {url: self.reader.get(url) for url in urls}
+            change()
+            for url, response in responses.items():
+                with self.subTest(url=url):
+                    self.assertEqual(
+                        self.revalidate(self.reader, url, response)
+                        .status_code,
+                        HTTPStatus.OK
+                    )
+
+    def test_etag_depends_on_user_and_page(self):
+        """ETag различается для пользователей и страниц ленты."""
+        url = self.pages[0]
+        response = self.guest.get(url)
+        self.assertEqual(
+            self.revalidate(self.reader, url, response).status_code,
+            HTTPStatus.OK
+        )
+        self.assertEqual(
+            self.revalidate(self.guest, url, response, page=2).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_missing_objects_not_found(self):
+        """Для несуществующих объектов проверка пропускается."""
+        for url in (
+            reverse('posts:profile', kwargs={'username': 'nobody'}),
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+        ):
+            with self.subTest(url=url):
+                response = self.guest.get(url, HTTP_IF_NONE_MATCH='"x"')
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,170 @@
+from http import HTTPStatus
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Follow, Group, Post, UserCounter
+from .factories import post_create, group_create, clean_counter
+
+User = get_user_model()
+
+
+class PostCountersTest(TransactionTestCase):
+    """
+    Кэш счётчиков сбрасывается после коммита, поэтому тесты идут без
+    транзакции вокруг каждого теста.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+        self.reader = User.objects.create_user('reader')
+        self.group = group_create()
+        self.group_2 = group_create()
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        clean_counter()
+
+    def test_counters_follow_post_creation_and_deletion(self):
+        """
+        Счётчики постов всего, группы, автора и ленты подписок
+        меняются при создании и удалении поста и затем читаются из кэша.
+        """
+        post_create(self.author, self.group)
+        self.assertEqual(counters.total_count(), 1)
+        self.assertEqual(counters.group_count(self.group.id), 1)
+        self.assertEqual(counters.author_count(self.author.id), 1)
+        self.assertEqual(counters.feed_count(self.reader.id), 1)
+        post = post_create(self.author, self.group)
+        self.assertEqual(counters.total_count(), 2)
+        self.assertEqual(counters.group_count(self.group.id), 2)
+        self.assertEqual(counters.author_count(self.author.id), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.total_count(), 2)
+            self.assertEqual(counters.group_count(self.group.id), 2)
+            self.assertEqual(counters.author_count(self.author.id), 2)
+        post.delete()
+        self.assertEqual(counters.total_count(), 1)
+        self.assertEqual(counters.group_count(self.group.id), 1)
+        self.assertEqual(counters.feed_count(self.reader.id), 1)
+
+    def test_rolled_back_write_keeps_cache(self):
+        """
+        Транзакция видит свои изменения счётчиков, а после отката
+        кэш хранит прежние значения.
+        """
+        post_create(self.author, self.group)
+        self.assertEqual(counters.total_count(), 1)
+        self.assertEqual(counters.author_count(self.author.id), 1)
+        with transaction.atomic():
+            post_create(self.author, self.group)
+            self.assertEqual(counters.total_count(), 2)
+            self.assertEqual(counters.author_counts([self.author.id]), {
+                self.author.id: 2
+            })
+            transaction.set_rollback(True)
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.total_count(), 1)
+            self.assertEqual(counters.author_count(self.author.id), 1)
+
+    def test_counters_follow_group_change(self):
+        """При переносе поста в другую группу меняются счётчики обеих."""
+        post = post_create(self.author, self.group)
+        self.assertEqual(counters.group_count(self.group.id), 1)
+        self.assertEqual(counters.group_count(self.group_2.id), 0)
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(counters.group_count(self.group.id), 0)
+        self.assertEqual(counters.group_count(self.group_2.id), 1)
+
+    def test_rebuild_command_fixes_drift(self):
+        """Команда rebuild_counters исправляет разошедшиеся счётчики."""
+        post = post_create(self.author, self.group)
+        UserCounter.objects.filter(user=self.author).update(
+            posts_count=42, followers_count=0
+        )
+        Group.objects.filter(pk=self.group.pk).update(posts_count=7)
+        Post.objects.filter(pk=post.pk).update(comments_count=3)
+        cache.set(counters.author_key(self.reader.id), 7)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(counters.author_count(self.author.id), 1)
+        self.assertEqual(counters.author_count(self.reader.id), 0)
+        self.assertEqual(counters.group_count(self.group.id), 1)
+        self.assertEqual(counters.follower_count(self.author.id), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_denormalized_counters_follow_writes(self):
+        """
+        Счётчики в базе меняются вместе с созданием и удалением постов,
+        комментариев и подписок.
+        """
+        post = post_create(self.author, self.group)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        author_counter = UserCounter.objects.get(user=self.author)
+        reader_counter = UserCounter.objects.get(user=self.reader)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(author_counter.posts_count, 1)
+        self.assertEqual(author_counter.followers_count, 1)
+        self.assertEqual(reader_counter.following_count, 1)
+        comment.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        post.refresh_from_db()
+        author_counter.refresh_from_db()
+        reader_counter.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(author_counter.followers_count, 0)
+        self.assertEqual(reader_counter.following_count, 0)
+
+    def test_profile_shows_cached_count(self):
+        """На странице профиля выводится количество постов из счётчика."""
+        post_create(self.author, self.group)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        self.assertEqual(response.context['count'], 1)
+
+
+class PageWindowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        for i in range(95):
+            post_create(cls.author, None)
+        clean_counter()
+
+    def test_paginator_renders_page_window(self):
+        """
+        Паджинатор показывает номера страниц только вокруг текущей
+        и первую, не глубже MAX_PAGE_NUMBER; последней страницы нет.
+        """
+        cache.clear()
+        response = self.client.get(reverse('posts:index'), {'page': 5})
+        self.assertEqual(
+            response.context['page_obj'].page_window, [1, None, 3, 4, 5]
+        )
+        self.assertNotContains(response, 'Последняя')
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['page_obj'].page_window, [1, 2, 3]
+        )
+
+    def test_deep_page_number_not_found(self):
+        """Глубокие страницы открываются только по курсору."""
+        response = self.client.get(reverse('posts:index'), {'page': 6})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.client.get(reverse('posts:index'), {'page': 'x'})
+        self.assertEqual(response.context['page_obj'].number, 1)
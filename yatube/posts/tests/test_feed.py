@@ -0,0 +1,181 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import FeedEntry, Follow
+from .factories import post_create, group_create, clean_counter
+
+User = get_user_model()
+
+
+class FeedEntryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        cls.other_author = User.objects.create_user('other')
+        cls.reader_user = User.objects.create_user('reader')
+        cls.group = group_create()
+        cls.old_post = post_create(cls.author, cls.group)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        self.reader = Client()
+        self.reader.force_login(self.reader_user)
+        cache.clear()
+
+    def feed_post_ids(self):
+        return list(
+            FeedEntry.objects.filter(user=self.reader_user)
+            .order_by('-pub_date', '-post_id')
+            .values_list('post_id', flat=True)
+        )
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """
+        После подписки в ленту попадают уже опубликованные посты автора,
+        после отписки — удаляются.
+        """
+        self.reader.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.feed_post_ids(), [self.old_post.id])
+        self.reader.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.feed_post_ids(), [])
+
+    def test_new_post_is_pushed_to_followers_only(self):
+        """Новый пост раскладывается только в ленты подписчиков автора."""
+        Follow.objects.create(user=self.reader_user, author=self.author)
+        new_post = post_create(self.author, None)
+        post_create(self.other_author, None)
+        self.assertEqual(
+            self.feed_post_ids(), [new_post.id, self.old_post.id]
+        )
+
+    def test_follow_index_reads_materialized_feed(self):
+        """
+        Лента подписок выводит посты из материализованной ленты
+        в порядке публикации.
+        """
+        Follow.objects.create(user=self.reader_user, author=self.author)
+        new_post = post_create(self.author, self.group)
+        response = self.reader.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post]
+        )
+        self.assertEqual(
+            response.context['page_obj'][0].group.title, self.group.title
+        )
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user('star')
+        cls.author = User.objects.create_user('author')
+        cls.reader_user = User.objects.create_user('reader')
+        cls.fan_user = User.objects.create_user('fan')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        cache.clear()
+        self.reader = Client()
+        self.reader.force_login(self.reader_user)
+        Follow.objects.create(user=self.reader_user, author=self.author)
+        Follow.objects.create(user=self.reader_user, author=self.star)
+        Follow.objects.create(user=self.fan_user, author=self.star)
+
+    def test_celebrity_posts_are_pulled_and_merged(self):
+        """
+        Посты популярного автора не раскладываются по лентам, но
+        выводятся в ленте подписок вперемешку с остальными по дате.
+        """
+        first = post_create(self.author, None)
+        star_post = post_create(self.star, None)
+        last = post_create(self.author, None)
+        self.assertFalse(
+            FeedEntry.objects.filter(post=star_post).exists()
+        )
+        response = self.reader.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [last, star_post, first]
+        )
+
+    def test_cursor_pages_over_merged_feed(self):
+        """Курсоры ленты подписок проходят по обоим источникам."""
+        posts = [
+            post_create(self.star if i % 3 else self.author, None)
+            for i in range(12)
+        ]
+        url = reverse('posts:follow_index')
+        first_page = self.reader.get(url).context['page_obj']
+        second_page = self.reader.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(first_page) + list(second_page), posts[::-1]
+        )
+
+    def test_demoted_author_posts_are_pushed(self):
+        """
+        Когда подписчиков становится меньше порога, посты автора
+        раскладываются оставшимся подписчикам.
+        """
+        star_post = post_create(self.star, None)
+        Follow.objects.filter(user=self.fan_user, author=self.star).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.reader_user, post=star_post
+            ).exists()
+        )
+
+    def test_unfollow_does_not_count_feed_entries(self):
+        """
+        Отписка решает по счётчику подписчиков: записи ленты автора
+        не пересчитываются, сверка остаётся команде rebuild_feed.
+        """
+        star_post = post_create(self.star, None)
+        with self.settings(FEED_CELEBRITY_FOLLOWERS=4):
+            with CaptureQueriesContext(connection) as queries:
+                Follow.objects.filter(
+                    user=self.fan_user, author=self.star
+                ).delete()
+            self.assertFalse(FeedEntry.objects.filter(post=star_post))
+            call_command('rebuild_feed', stdout=StringIO())
+        self.assertNotIn(
+            'COUNT', ' '.join(query['sql'] for query in queries)
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.reader_user, post=star_post
+            ).exists()
+        )
+
+    def test_rebuild_command_pushes_authors_below_threshold(self):
+        star_post = post_create(self.star, None)
+        post_create(self.author, None)
+        out = StringIO()
+        with self.settings(FEED_CELEBRITY_FOLLOWERS=3):
+            call_command('rebuild_feed', stdout=out)
+        self.assertIn('Разложено заново авторов: 1', out.getvalue())
+        self.assertEqual(
+            FeedEntry.objects.filter(post=star_post).count(), 2
+        )
@@ -1,10 +1,16 @@
+import hashlib
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image, ImageFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from core.storage import ContentAddressedStorage
 from posts.forms import PostForm
 from posts.models import Post, Comment
 from django.core.cache import cache
@@ -74,7 +80,9 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertTrue(Post.objects.filter(
             text='Созданный пост',
-            image='posts/small.gif'
+            image=ContentAddressedStorage.hashed_name(
+                'posts/small.gif', hashlib.sha256(small_gif).hexdigest()
+            )
         ).exists())
 
     def test_edit_post(self):
@@ -129,3 +137,92 @@ class PostFormTests(TestCase):
         self.assertTrue(Post.objects.filter(
             comments__text='Комментарий к посту'
         ))
+
+
+def image_upload(size, image_format='PNG', exif=None, name='image.png'):
+    buffer = BytesIO()
+    options = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', size, (255, 0, 0)).save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=100)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def cleaned_image(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        image = form.cleaned_data['image']
+        image.seek(0)
+        return image, Image.open(image)
+
+    def image_errors(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertFalse(form.is_valid())
+        return form.errors['image']
+
+    def test_small_image_kept(self):
+        """Небольшая картинка сохраняется без изменений."""
+        upload = image_upload((80, 40))
+        image, _ = self.cleaned_image(upload)
+        self.assertIs(image, upload)
+
+    def test_large_image_downscaled(self):
+        """Длинная сторона большой картинки уменьшается до предела."""
+        image, opened = self.cleaned_image(image_upload((300, 150)))
+        self.assertEqual(opened.size, (100, 50))
+        self.assertEqual(opened.format, 'PNG')
+        self.assertEqual(image.name, 'image.png')
+
+    def test_gif_resaved_as_png(self):
+        """Уменьшенная картинка в формате GIF сохраняется в PNG."""
+        image, opened = self.cleaned_image(
+            image_upload((300, 150), 'GIF', name='image.gif')
+        )
+        self.assertEqual(opened.format, 'PNG')
+        self.assertEqual(image.name, 'image.png')
+
+    def test_exif_orientation_applied(self):
+        """Поворот из EXIF применяется к сохраняемой картинке."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой стрелке
+        _, opened = self.cleaned_image(
+            image_upload((60, 30), 'JPEG', exif.tobytes(), 'photo.jpg')
+        )
+        self.assertEqual(opened.size, (30, 60))
+        self.assertEqual(opened.getexif().get(0x0112, 1), 1)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels(self):
+        """Картинка с огромным разрешением отклоняется."""
+        errors = self.image_errors(image_upload((50, 50)))
+        self.assertIn('разрешение', errors[0])
+
+    def test_large_png_rejected_before_decoding(self):
+        """
+        PNG не декодируется в уменьшенном масштабе, поэтому картинка
+        в 20 мегапикселей отклоняется, не распаковываясь.
+        """
+        upload = image_upload((5000, 4000))
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load:
+            errors = self.image_errors(upload)
+        self.assertIn('не больше 16 мегапикселей', errors[0])
+        load.assert_not_called()
+
+    @override_settings(IMAGE_MAX_DECODED_PIXELS=1000)
+    def test_jpeg_keeps_full_pixel_limit(self):
+        """JPEG декодируется уменьшенным, для него предел прежний."""
+        _, opened = self.cleaned_image(
+            image_upload((200, 100), 'JPEG', name='photo.jpg')
+        )
+        self.assertEqual(opened.size, (100, 50))
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=10)
+    def test_file_too_large(self):
+        """Слишком большой файл отклоняется до открытия."""
+        errors = self.image_errors(image_upload((10, 10)))
+        self.assertIn('слишком большой', errors[0])
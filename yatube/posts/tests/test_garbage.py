@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from posts import garbage, thumbnails
+from posts.models import MediaBlob, Post
+from .factories import post_create, clean_counter
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaGarbageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._recent.clear()
+        self.storage = Post._meta.get_field('image').storage
+        self.kept = self.post_with_thumbnails(SMALL_GIF)
+        removed = self.post_with_thumbnails(SMALL_GIF + b'\x00')
+        self.removed_image = removed.image.name
+        self.removed_thumbnail = thumbnails.ready_picture(
+            removed.image, 'card'
+        ).url
+        # удаление файла после фиксации транзакции в тесте не происходит
+        removed.delete()
+        self.stray_image = self.storage.save(
+            'posts/stray.gif', ContentFile(SMALL_GIF + b'\x01')
+        )
+        self.stray_thumbnail = default.storage.save(
+            'cache/00/00/stray.jpg', ContentFile(b'jpeg')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post_with_thumbnails(self, content):
+        post = post_create(
+            self.author, None,
+            SimpleUploadedFile('image.gif', content, 'image/gif')
+        )
+        for variant in thumbnails.VARIANTS:
+            thumbnails.build_picture(post.image, variant)
+        return post
+
+    def thumbnail_name(self, url):
+        return url[len(settings.MEDIA_URL):]
+
+    def test_orphans_removed(self):
+        """
+        Удаляются картинка удалённого поста с миниатюрами, картинка без
+        поста и миниатюра без записи; картинки живых постов остаются.
+        """
+        stats = garbage.collect(grace=0, batch_size=2)
+        self.assertEqual(stats['originals'], 2)
+        self.assertGreaterEqual(stats['thumbnails'], 1)
+        self.assertGreater(stats['bytes'], 0)
+        for name in (self.removed_image, self.stray_image):
+            self.assertFalse(self.storage.exists(name))
+        for url in (self.removed_thumbnail, '/media/' + self.stray_thumbnail):
+            self.assertFalse(
+                default.storage.exists(self.thumbnail_name(url))
+            )
+        self.assertFalse(MediaBlob.objects.filter(
+            pk=self.removed_image
+        ).exists())
+        self.assertTrue(self.storage.exists(self.kept.image.name))
+        for variant in thumbnails.VARIANTS:
+            thumbnails._recent.clear()
+            picture = thumbnails.ready_picture(self.kept.image, variant)
+            self.assertTrue(picture.complete)
+            self.assertTrue(
+                default.storage.exists(self.thumbnail_name(picture.url))
+            )
+
+    def test_fresh_files_kept(self):
+        """Недавно записанные файлы не удаляются."""
+        garbage.collect(grace=3600)
+        self.assertTrue(self.storage.exists(self.stray_image))
+        self.assertTrue(default.storage.exists(self.stray_thumbnail))
+
+    def test_dry_run(self):
+        """Пробный запуск только считает, что можно удалить."""
+        out = StringIO()
+        call_command(
+            'collect_media_garbage', '--grace=0', '--dry-run', stdout=out
+        )
+        self.assertIn('Будет удалено: картинок 2', out.getvalue())
+        self.assertTrue(self.storage.exists(self.removed_image))
+        self.assertTrue(self.storage.exists(self.stray_image))
@@ -0,0 +1,194 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from core import pagecache
+from posts.models import Comment, Follow, Post
+from .factories import clean_counter, group_create, post_create
+
+User = get_user_model()
+
+
+class PageCacheTests(TransactionTestCase):
+    """
+    Ключи сбрасываются после коммита, поэтому тесты идут без
+    транзакции вокруг каждого теста.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+        self.reader = User.objects.create_user('reader')
+        self.group = group_create()
+        self.post = post_create(self.author, self.group)
+        self.other_post = post_create(self.reader, None)
+        self.guest = Client()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            'post': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}
+            ),
+            'other_post': reverse(
+                'posts:post_detail', kwargs={'post_id': self.other_post.id}
+            ),
+        }
+        for url in self.urls.values():
+            self.guest.get(url)
+
+    def tearDown(self):
+        clean_counter()
+
+    def assertCached(self, name):
+        with self.assertNumQueries(0):
+            response = self.guest.get(self.urls[name])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response
+
+    def assertRebuilt(self, name):
+        response = self.guest.get(self.urls[name])
+        self.assertTemplateUsed(response, 'base.html')
+        return response
+
+    def test_repeat_from_cache(self):
+        """Повторный анонимный запрос не доходит до базы и шаблонов."""
+        for name in self.urls:
+            with self.subTest(name=name):
+                response = self.assertCached(name)
+                self.assertEqual(response.templates, [])
+        self.assertContains(self.assertCached('post'), self.post.text)
+
+    def test_unknown_parameters_share_entry(self):
+        """Лишние параметры адреса не заводят новых записей в кэше."""
+        with self.assertNumQueries(0):
+            response = self.guest.get(
+                self.urls['index'], {'utm_source': 'mail', 'x': '1'}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        second = self.guest.get(self.urls['index'], {'page': 2, 'x': '1'})
+        self.assertTemplateUsed(second, 'base.html')
+        with self.assertNumQueries(0):
+            self.guest.get(self.urls['index'], {'x': '2', 'page': 2})
+
+    def test_surrogate_keys(self):
+        response = self.guest.get(self.urls['group'])
+        self.assertEqual(response[pagecache.HEADER].split(), [
+            f'group-{self.group.slug}',
+            f'post-{self.post.id}',
+            f'byline-{self.author.id}',
+        ])
+
+    def test_post_change_purges_its_pages(self):
+        """Правка поста сбрасывает только страницы с его карточкой."""
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(name=name):
+                self.assertContains(
+                    self.assertRebuilt(name), 'Исправленный текст'
+                )
+        self.assertCached('other_post')
+
+    def test_new_post_purges_lists(self):
+        post = post_create(self.author, None)
+        for name in ('index', 'profile'):
+            with self.subTest(name=name):
+                self.assertContains(self.assertRebuilt(name), post.text)
+        self.assertCached('group')
+
+    def test_comment_purges_post(self):
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertContains(self.assertRebuilt('post'), 'Комментарий')
+        self.assertCached('other_post')
+
+    def test_follow_purges_profiles(self):
+        """Подписка сбрасывает профиль, но не страницы постов автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.assertRebuilt('profile'), 'Подписчиков: 1')
+        self.assertCached('index')
+        self.assertCached('post')
+
+    def test_author_rename_purges_bylines(self):
+        """
+        Переименование сбрасывает страницы с подписью автора одним
+        ключом, в том числе страницы постов с его комментариями.
+        """
+        Comment.objects.create(
+            post=self.other_post, author=self.author, text='Комментарий'
+        )
+        self.guest.get(self.urls['other_post'])
+        self.author.username = 'renamed'
+        with self.assertNumQueries(1):
+            self.author.save(update_fields=['username'])
+        for name in ('index', 'group', 'post', 'other_post'):
+            with self.subTest(name=name):
+                self.assertContains(self.assertRebuilt(name), 'renamed')
+
+    def test_new_post_purges_author_count(self):
+        """Число постов автора на странице поста меняется с новым постом."""
+        post_create(self.author, None)
+        self.assertContains(self.assertRebuilt('post'), 'Всего постов')
+        self.assertCached('other_post')
+
+    def test_group_rename_purges_cards(self):
+        self.group.title = 'Новое название'
+        self.group.save()
+        for name in ('group', 'post'):
+            with self.subTest(name=name):
+                self.assertContains(
+                    self.assertRebuilt(name), 'Новое название'
+                )
+        self.assertCached('other_post')
+
+    def test_deleted_group_purges_its_posts(self):
+        self.group.delete()
+        self.assertNotContains(self.assertRebuilt('post'), 'Группа:')
+        self.assertCached('other_post')
+
+    def test_deleted_post_purged(self):
+        Post.objects.filter(pk=self.post.pk).delete()
+        response = self.guest.get(self.urls['post'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertNotContains(self.assertRebuilt('index'), self.post.text)
+
+    def test_not_modified(self):
+        """Попадание в кэш тоже отвечает на условный запрос."""
+        etag = self.guest.get(self.urls['post'])['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest.get(
+                self.urls['post'], HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_authorized_bypass(self):
+        """Страницы вошедших и посетителей с сессией не кэшируются."""
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(self.urls['post'])
+        self.assertTemplateUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        client.logout()
+        client.cookies['sessionid'] = 'expired'
+        self.assertTemplateUsed(
+            client.get(self.urls['post']), 'posts/post_detail.html'
+        )
+
+    def test_uncommitted_not_shared(self):
+        """Страница из незакоммиченных данных не попадает в кэш."""
+        with transaction.atomic():
+            Post.objects.filter(pk=self.post.pk).update(text='Черновик')
+            self.post.save(update_fields=['updated'])
+            self.assertContains(self.assertRebuilt('post'), 'Черновик')
+            transaction.set_rollback(True)
+        self.assertNotContains(self.assertCached('post'), 'Черновик')
@@ -0,0 +1,191 @@
+import re
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Follow, Post
+from posts.views import COMMENTS_LIMIT
+from .factories import post_create, group_create, clean_counter
+
+User = get_user_model()
+
+# Таблицы, которые допустимо читать целиком: справочник групп
+# выводится полностью в списке выбора формы поста.
+FULL_SCAN_ALLOWED = {'posts_group'}
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+# Выборки, которые допустимо сортировать во временном B-дереве:
+# результаты поиска упорядочены по bm25, который считается для
+# найденных строк, — такой порядок индекс дать не может, а сортируются
+# только строки, совпавшие с запросом.
+TEMP_SORT_ALLOWED = ('bm25(',)
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@unittest.skipUnless(
+    connection.vendor == 'sqlite', 'Планы запросов проверяются для SQLite'
+)
+class QueryPlanTests(TestCase):
+    """
+    Для каждой страницы приложения posts снимаем план (EXPLAIN QUERY
+    PLAN) всех выполненных запросов: ни один не должен читать таблицу
+    целиком или сортировать выборку во временном B-дереве (кроме
+    исключений `FULL_SCAN_ALLOWED` и `TEMP_SORT_ALLOWED`).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user('author')
+        cls.reader_user = User.objects.create_user('reader')
+        cls.group = group_create()
+        for i in range(12):
+            post_create(cls.author_user, cls.group)
+        cls.post = post_create(cls.author_user, cls.group)
+        for i in range(COMMENTS_LIMIT + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader_user, text='Комментарий'
+            )
+        Follow.objects.create(user=cls.reader_user, author=cls.author_user)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        self.author = Client()
+        self.author.force_login(self.author_user)
+        self.reader = Client()
+        self.reader.force_login(self.reader_user)
+        cache.clear()
+
+    def assertPlansUseIndexes(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            for step in query_plan(sql):
+                with self.subTest(sql=sql, step=step):
+                    full_scan = FULL_SCAN.match(step)
+                    if full_scan:
+                        self.assertIn(full_scan.group(1), FULL_SCAN_ALLOWED)
+                    if not any(part in sql for part in TEMP_SORT_ALLOWED):
+                        self.assertNotIn(TEMP_SORT, step)
+        return response
+
+    def test_feed_pages_use_indexes(self):
+        """Ленты на первой, второй и курсорной страницах идут по индексу."""
+        feeds = [
+            (self.reader, reverse('posts:index')),
+            (self.reader, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            )),
+            (self.reader, reverse(
+                'posts:profile', kwargs={'username': 'author'}
+            )),
+            (self.reader, reverse('posts:follow_index')),
+        ]
+        for client, url in feeds:
+            with self.subTest(url=url):
+                response = self.assertPlansUseIndexes(
+                    lambda: client.get(url)
+                )
+                cursor = response.context['page_obj'].next_cursor
+                self.assertPlansUseIndexes(
+                    lambda: client.get(url, {'page': 2})
+                )
+                self.assertPlansUseIndexes(
+                    lambda: client.get(url, {'cursor': cursor})
+                )
+
+    @unittest.skipUnless(search.enabled(), 'Поиск по индексу FTS5')
+    def test_search_uses_indexes(self):
+        """
+        Поиск идёт по индексу FTS5, посты выбираются по первичному
+        ключу; сортируется только ранжированная выборка найденных.
+        """
+        for i in range(12):
+            Post.objects.create(author=self.author_user, text=f'Котики {i}')
+        url = reverse('posts:search')
+        response = self.assertPlansUseIndexes(
+            lambda: self.reader.get(url, {'q': 'котики'})
+        )
+        cursor = response.context['page_obj'].next_cursor
+        self.assertIsNotNone(cursor)
+        self.assertPlansUseIndexes(
+            lambda: self.reader.get(url, {'q': 'котики', 'page': 2})
+        )
+        self.assertPlansUseIndexes(
+            lambda: self.reader.get(url, {'q': 'котики', 'cursor': cursor})
+        )
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=1)
+    def test_pulled_follow_feed_uses_indexes(self):
+        """Посты популярных авторов подтягиваются в ленту по индексу."""
+        other = User.objects.create_user('other')
+        post_create(other, None)
+        Follow.objects.create(user=self.reader_user, author=other)
+        url = reverse('posts:follow_index')
+        response = self.assertPlansUseIndexes(lambda: self.reader.get(url))
+        cursor = response.context['page_obj'].next_cursor
+        self.assertPlansUseIndexes(
+            lambda: self.reader.get(url, {'cursor': cursor})
+        )
+
+    def test_post_pages_use_indexes(self):
+        """Страницы поста, его создания и редактирования идут по индексу."""
+        post_id = self.post.id
+        requests = [
+            lambda: self.reader.get(
+                reverse('posts:post_detail', kwargs={'post_id': post_id})
+            ),
+            lambda: self.author.get(reverse('posts:post_create')),
+            lambda: self.author.get(
+                reverse('posts:post_edit', kwargs={'post_id': post_id})
+            ),
+            lambda: self.author.post(
+                reverse('posts:post_create'), {'text': 'Новый пост'}
+            ),
+            lambda: self.reader.post(
+                reverse('posts:add_comment', kwargs={'post_id': post_id}),
+                {'text': 'Ещё комментарий'}
+            ),
+        ]
+        for request in requests:
+            self.assertPlansUseIndexes(request)
+
+    def test_comment_batches_use_indexes(self):
+        """Порции комментариев выбираются по индексу без сортировки."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.assertPlansUseIndexes(lambda: self.reader.get(detail))
+        cursor = response.context['comments'].next_cursor
+        self.assertIsNotNone(cursor)
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        self.assertPlansUseIndexes(
+            lambda: self.reader.get(url, {'cursor': cursor})
+        )
+
+    def test_follow_pages_use_indexes(self):
+        """Подписка и отписка не читают таблицы целиком."""
+        for name in ('posts:profile_unfollow', 'posts:profile_follow'):
+            with self.subTest(name=name):
+                self.assertPlansUseIndexes(
+                    lambda: self.reader.get(
+                        reverse(name, kwargs={'username': 'author'})
+                    )
+                )
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from core import querycache
+from posts.models import FeedEntry, Group, Post
+from .factories import clean_counter, group_create, post_create
+
+User = get_user_model()
+
+
+class QueryCacheTests(TransactionTestCase):
+    """
+    Версии таблиц меняются после коммита, поэтому тесты идут без
+    транзакции вокруг каждого теста.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.group = group_create()
+
+    def tearDown(self):
+        clean_counter()
+
+    def get_group(self):
+        return Group.objects.cached().get(slug=self.group.slug)
+
+    def test_repeat_from_cache(self):
+        """Повторная выборка не обращается к базе."""
+        self.get_group()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_group(), self.group)
+
+    def test_not_cached_by_default(self):
+        list(Group.objects.all())
+        with self.assertNumQueries(1):
+            list(Group.objects.all())
+
+    def test_save_invalidates(self):
+        self.get_group()
+        Group.objects.filter(pk=self.group.pk).update(title='Новое название')
+        self.assertEqual(self.get_group().title, 'Новое название')
+
+    def test_joined_table_invalidates(self):
+        """Запись в таблицу из JOIN сбрасывает выборку постов."""
+        post = post_create(self.user, self.group)
+        posts = Post.objects.cached().select_related('author')
+        self.assertEqual(posts.get(pk=post.pk).author.username, 'author')
+        User.objects.filter(pk=self.user.pk).update(username='writer')
+        self.assertEqual(posts.get(pk=post.pk).author.username, 'writer')
+        Post.objects.filter(pk=post.pk).update(
+            comments_count=F('comments_count') + 1
+        )
+        self.assertEqual(posts.get(pk=post.pk).comments_count, 1)
+
+    def test_transaction(self):
+        """
+        До коммита выборки по изменённой таблице идут мимо кэша,
+        после отката прежний результат остаётся верным.
+        """
+        self.get_group()
+        with transaction.atomic():
+            Group.objects.filter(pk=self.group.pk).update(title='Черновик')
+            self.assertEqual(self.get_group().title, 'Черновик')
+            transaction.set_rollback(True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_group().title, self.group.title)
+        with transaction.atomic():
+            Group.objects.filter(pk=self.group.pk).update(title='Готово')
+        self.assertEqual(self.get_group().title, 'Готово')
+
+    def test_untracked_table(self):
+        """Выборки из неотслеживаемых таблиц не кэшируются."""
+        entries = querycache.cached(FeedEntry.objects.all())
+        list(entries)
+        with self.assertNumQueries(1):
+            list(entries.all())
+
+    def test_views(self):
+        """Повторный запрос страницы группы обходится без запросов к базе."""
+        post_create(self.user, self.group)
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        client = Client()
+        client.get(url)
+        with self.assertNumQueries(0):
+            response = client.get(url)
+        self.assertContains(response, self.group.title)
@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+from posts.stemming import stem
+from .factories import clean_counter
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова приводятся к общей основе."""
+        forms = {
+            'кот': ['кот', 'кота', 'котом', 'коты', 'котов'],
+            'книг': ['книга', 'книги', 'книгами', 'Книгу'],
+            'важн': ['важная', 'важнее', 'важнейшие', 'важного'],
+            'программирован': ['программирование', 'программированием'],
+            'елк': ['ёлки', 'елка'],
+        }
+        for expected, words in forms.items():
+            for word in words:
+                with self.subTest(word=word):
+                    self.assertEqual(stem(word), expected)
+
+
+class PostSearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        texts = ['Мой кот спит', 'Коты и котов много', 'Про собак']
+        texts += [f'Заметка про котов номер {i}' for i in range(12)]
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=text)
+            for text in texts
+        ]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        self.guest = Client()
+        cache.clear()
+
+    def found(self, query):
+        return set(
+            search.matching(Post.objects.all(), query).values_list(
+                'text', flat=True
+            )
+        )
+
+    def test_search_finds_word_forms(self):
+        """Поиск находит все формы слова и не находит остальное."""
+        self.assertEqual(len(self.found('котами')), 14)
+        self.assertEqual(self.found('собаки'), {'Про собак'})
+        self.assertEqual(self.found('кот спит'), {'Мой кот спит'})
+        for query in ('', '!!!', '" OR * AND (', 'NEAR(кот)'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    self.guest.get(
+                        reverse('posts:search'), {'q': query}
+                    ).status_code,
+                    200
+                )
+
+    def test_results_ranked_and_paginated_by_cursor(self):
+        """
+        Выдача отсортирована по релевантности, а курсоры проходят её
+        целиком без пропусков и повторов.
+        """
+        url = reverse('posts:search')
+        response = self.guest.get(url, {'q': 'кот'})
+        page = response.context['page_obj']
+        self.assertEqual(page[0].text, 'Коты и котов много')
+        seen = list(page)
+        while page.next_cursor:
+            response = self.guest.get(
+                url, {'q': 'кот', 'cursor': page.next_cursor}
+            )
+            page = response.context['page_obj']
+            seen.extend(page)
+        self.assertEqual(len(seen), 14)
+        self.assertEqual(len({post.id for post in seen}), 14)
+        relevance = [post.relevance for post in seen]
+        self.assertEqual(relevance, sorted(relevance, reverse=True))
+        self.assertContains(
+            self.guest.get(url, {'q': 'кот'}), '?q=%D0%BA%D0%BE%D1%82&'
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при редактировании и удалении поста."""
+        post = self.posts[2]
+        post.text = 'Про кошку'
+        post.save()
+        self.assertEqual(self.found('собака'), set())
+        self.assertEqual(self.found('кошки'), {'Про кошку'})
+        post.delete()
+        self.assertEqual(self.found('кошки'), set())
+        Post.objects.filter(pk=self.posts[0].pk).update(text='Про птиц')
+        self.assertEqual(self.found('птицы'), set())
+        search.rebuild()
+        self.assertEqual(self.found('птицы'), {'Про птиц'})
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит формы слова."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
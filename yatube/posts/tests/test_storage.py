@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from posts import blobs, thumbnails
+from posts.models import MediaBlob
+from .factories import post_create, clean_counter
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def upload(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(name, content, 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        clean_counter()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._recent.clear()
+
+    def files(self):
+        directory = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names
+        ]
+
+    def test_same_content_stored_once(self):
+        """
+        Одинаковые загрузки под разными именами хранятся одним файлом,
+        на который ссылаются оба поста, и делят миниатюры.
+        """
+        content = SMALL_GIF + b'\x01'
+        files = self.files()
+        first = post_create(self.author, None, upload('cat.gif', content))
+        second = post_create(self.author, None, upload('copy.GIF', content))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(len(self.files()), len(files) + 1)
+        self.assertEqual(MediaBlob.objects.get(pk=first.image.name).refs, 2)
+        picture = thumbnails.post_thumbnail(first, 'card')
+        self.assertEqual(
+            thumbnails.post_thumbnail(second, 'card').url, picture.url
+        )
+
+    def test_unused_file_deleted(self):
+        """Файл удаляется, когда на него не ссылается ни один пост."""
+        first = post_create(self.author, None, upload())
+        second = post_create(self.author, None, upload())
+        name = first.image.name
+        first.delete()
+        self.assertFalse(blobs.delete_unused(name))
+        self.assertTrue(first.image.storage.exists(name))
+        second.delete()
+        self.assertTrue(blobs.delete_unused(name))
+        self.assertFalse(first.image.storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(pk=name).exists())
+
+    def test_replaced_image_released(self):
+        """При замене картинки поста ссылка на прежний файл снимается."""
+        post = post_create(self.author, None, upload())
+        previous = post.image.name
+        post.image = upload(content=SMALL_GIF + b'\x00')
+        post.save()
+        self.assertNotEqual(post.image.name, previous)
+        self.assertEqual(MediaBlob.objects.get(pk=previous).refs, 0)
+        self.assertEqual(MediaBlob.objects.get(pk=post.image.name).refs, 1)
+
+    def test_delete_during_identical_upload(self):
+        """
+        Если файл удалили, пока сохранялся пост с тем же содержимым,
+        пост всё равно ссылается на существующий файл.
+        """
+        post = post_create(self.author, None, upload())
+        name = post.image.name
+        post.delete()
+        storage = post.image.storage
+        save = storage._save
+        deleted = []
+
+        def save_then_delete(*args):
+            # хранилище нашло готовый файл, а удаление из другого
+            # процесса успело до ссылки на него
+            saved = save(*args)
+            if not deleted:
+                deleted.append(blobs.delete_unused(saved))
+            return saved
+
+        with mock.patch.object(
+            type(storage), '_save', side_effect=save_then_delete
+        ):
+            second = post_create(self.author, None, upload('copy.gif'))
+        self.assertEqual(deleted, [True])
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(pk=name).refs, 1)
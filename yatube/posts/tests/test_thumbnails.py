@@ -0,0 +1,353 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, features
+
+from core import fragments
+from posts import thumbnail_worker, thumbnails
+from posts.models import Post
+from .factories import post_create, clean_counter
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PLACEHOLDER = 'Картинка обрабатывается'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailPregenerationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        clean_counter()
+
+    def setUp(self):
+        self.guest = Client()
+        cache.clear()
+        thumbnails._recent.clear()
+        self.post = post_create(
+            self.author, None,
+            SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+
+    def test_placeholder_until_thumbnails_ready(self):
+        """
+        Пока миниатюры строятся, вместо картинки выводится заглушка;
+        после построения карточки перерисовываются с картинкой.
+        """
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in pages:
+            with self.subTest(url=url):
+                self.assertContains(self.guest.get(url), PLACEHOLDER)
+        with self.settings(THUMBNAIL_WORKERS=0):
+            thumbnails._submit(self.post.id, self.post.image.name)
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertNotContains(response, PLACEHOLDER)
+                self.assertContains(response, '/media/cache/')
+        for variant in thumbnails.VARIANTS:
+            self.assertIsNotNone(
+                thumbnails.ready_picture(self.post.image, variant)
+            )
+
+    def test_missing_file_not_marked_ready(self):
+        """Для отсутствующего файла миниатюры не считаются готовыми."""
+        with self.assertLogs('sorl.thumbnail'):
+            ready = thumbnail_worker.generate(
+                'posts/missing.gif', list(thumbnails.VARIANTS.values())
+            )
+        self.assertFalse(ready)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailPageCacheTest(TransactionTestCase):
+    """
+    Страницы анонимных посетителей кэшируются только вне транзакции,
+    поэтому тест идёт без транзакции вокруг него.
+    """
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._recent.clear()
+        # построение ставится вручную, когда страницы уже в кэше
+        self.submit = mock.patch.object(thumbnails, '_submit')
+        self.submit.start()
+        self.addCleanup(self.submit.stop)
+        author = User.objects.create_user('author')
+        self.post = post_create(
+            author, None,
+            SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+
+    def tearDown(self):
+        clean_counter()
+
+    def test_ready_thumbnails_purge_cached_pages(self):
+        guest = Client()
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in pages:
+            guest.get(url)
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertContains(guest.get(url), PLACEHOLDER)
+        self.submit.stop()
+        with self.settings(THUMBNAIL_WORKERS=0):
+            thumbnails._submit(self.post.id, self.post.image.name)
+        for url in pages:
+            with self.subTest(url=url):
+                response = guest.get(url)
+                self.assertTemplateUsed(response, 'base.html')
+                self.assertNotContains(response, PLACEHOLDER)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailLookupTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        cls.posts = [
+            post_create(
+                cls.author, None,
+                SimpleUploadedFile(f'small{i}.gif', SMALL_GIF, 'image/gif')
+            )
+            for i in range(5)
+        ]
+        with override_settings(THUMBNAIL_WORKERS=0):
+            for post in cls.posts:
+                thumbnails._submit(post.id, post.image.name)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        clean_counter()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._recent.clear()
+
+    def kvstore_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+
+    def test_page_reads_thumbnails_at_once(self):
+        """Миниатюры всей страницы ленты читаются одним запросом."""
+        queries = self.kvstore_queries(
+            lambda: Client().get(reverse('posts:index'))
+        )
+        self.assertEqual(len(queries), 1)
+
+    def test_prefetch(self):
+        """
+        Предвыборка находит все миниатюры; повторная берёт их из памяти
+        процесса без обращения к хранилищу.
+        """
+        queries = self.kvstore_queries(
+            lambda: thumbnails.prefetch(self.posts, 'card')
+        )
+        self.assertEqual(len(queries), 1)
+        for post in self.posts:
+            self.assertIsNotNone(post._thumbnails['card'])
+            # записи хранилища в кэше; версии картинок остаются
+            thumbnails._forget_missing(post.image.name)
+        self.assertEqual(
+            self.kvstore_queries(
+                lambda: thumbnails.prefetch(self.posts, 'card')
+            ),
+            []
+        )
+
+    def test_forget_reaches_other_processes(self):
+        """
+        Миниатюры, удалённые другим процессом, больше не берутся из
+        памяти: их выдаёт смена версии картинки в общем кэше.
+        """
+        post = self.posts[0]
+        self.assertIsNotNone(thumbnails.ready_picture(post.image, 'card'))
+        # forget в другом процессе: его память не видна, а версия общая
+        fragments.bump(thumbnails.image_namespace(post.image.name))
+        thumbnails._forget_missing(post.image.name)
+        self.assertEqual(
+            len(self.kvstore_queries(
+                lambda: thumbnails.ready_picture(post.image, 'card')
+            )),
+            1
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ResponsiveImageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        cls.post = post_create(
+            cls.author, None,
+            SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        clean_counter()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._recent.clear()
+
+    def test_srcset_widths(self):
+        """Картинка выводится в нескольких ширинах через srcset."""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, ' 480w, ')
+        self.assertContains(response, ' 960w"')
+        self.assertContains(
+            response, 'sizes="(max-width: 960px) 100vw, 960px"'
+        )
+
+    @override_settings(THUMBNAIL_FORMATS=['BMP', 'WEBP'])
+    def test_unsupported_formats_skipped(self):
+        """Неизвестные и не поддерживаемые Pillow форматы пропускаются."""
+        expected = ['WEBP'] if features.check('webp') else []
+        self.assertEqual(thumbnails.formats(), expected)
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    @override_settings(THUMBNAIL_FORMATS=['WEBP'])
+    def test_webp_source(self):
+        """Миниатюры в WebP предлагаются браузеру раньше исходного формата."""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '.webp 480w')
+
+    def test_report_savings(self):
+        """Команда сравнивает размеры миниатюр с миниатюрой полной ширины."""
+        for variant in thumbnails.VARIANTS:
+            thumbnails.build_picture(self.post.image, variant)
+        out = StringIO()
+        call_command('report_image_savings', stdout=out)
+        self.assertIn('card', out.getvalue())
+        self.assertIn('Всего сэкономлено байт:', out.getvalue())
+        self.assertNotIn('без готовых миниатюр', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ImagePlaceholderTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        clean_counter()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._recent.clear()
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), (255, 0, 0)).save(buffer, 'PNG')
+        self.post = post_create(
+            self.author, None,
+            SimpleUploadedFile('red.png', buffer.getvalue(), 'image/png')
+        )
+
+    def test_described_on_save(self):
+        """Цвет и превью картинки сохраняются вместе с постом."""
+        self.assertEqual(self.post.image_color, '#ff0000')
+        self.assertTrue(
+            self.post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+
+    def test_described_once(self):
+        """Без смены картинки файл при сохранении поста не читается."""
+        with mock.patch('posts.placeholders.describe_image') as describe:
+            self.post.text = 'Новый текст'
+            self.post.save()
+        describe.assert_not_called()
+
+    def test_rebuild_command(self):
+        """Команда заполняет сведения постов, сохранённых в обход сигналов."""
+        Post.objects.filter(pk=self.post.pk).update(
+            image_color='', image_placeholder=''
+        )
+        out = StringIO()
+        call_command('rebuild_image_placeholders', stdout=out)
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_color, '#ff0000')
+
+    def test_missing_file(self):
+        """Для отсутствующего файла сведения пустые, пост сохраняется."""
+        post = post_create(self.author, None, 'posts/missing.png')
+        self.assertEqual(post.image_color, '')
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_markup(self):
+        """
+        Заглушка и готовая картинка выводятся с цветом и превью,
+        картинка — с размерами и ленивой загрузкой.
+        """
+        url = reverse('posts:index')
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+        response = Client().get(url)
+        self.assertContains(response, 'background: #ff0000 url(')
+        self.assertContains(response, 'aspect-ratio: 960 / 339;')
+        self.assertContains(
+            Client().get(detail_url), 'aspect-ratio: 672 / 237;'
+        )
+        with self.settings(THUMBNAIL_WORKERS=0):
+            thumbnails._submit(self.post.id, self.post.image.name)
+        response = Client().get(url)
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'background: #ff0000 url(')
+        response = Client().get(detail_url)
+        self.assertContains(response, 'loading="eager"')
+        self.assertContains(response, 'width="672" height="237"')
@@ -143,16 +143,60 @@ class PostURLTests(TestCase):
 
     def test_index_page_cache(self):
         """
-        При запросе к главной страницы информация загружается из БД и
-        сохраняется в кэш, при повторном запросе инфомация загружается из кэша.
+        Список постов на главной берётся из кэша, пока посты не
+        изменялись через модель; сохранение или удаление поста сбрасывает
+        кэш, а разные страницы кэшируются отдельно.
         """
-        def response(page):
-            return self.guest.get(page)
         index = reverse('posts:index')
-        response_1 = response(index)
-        Post.objects.all().delete()
-        response_with_cache = response(index)
+        response_1 = self.guest.get(index)
+        # update() не отправляет сигналов: страница остаётся в кэше
+        Post.objects.update(text='Изменённый текст')
+        response_with_cache = self.guest.get(index)
         self.assertEqual(response_1.content, response_with_cache.content)
-        cache.clear()
-        response_without_cache = response(index)
-        self.assertNotEqual(response_1.content, response_without_cache.content)
+        Post.objects.get(pk=self.post.pk).save()
+        response_after_save = self.guest.get(index)
+        self.assertIn('Изменённый текст', response_after_save.content.decode())
+        Post.objects.all().delete()
+        response_after_delete = self.guest.get(index)
+        self.assertNotIn(
+            'Изменённый текст', response_after_delete.content.decode()
+        )
+
+    def test_index_pages_cached_separately(self):
+        """Вторая страница главной не отдаёт кэш первой."""
+        for i in range(10):
+            post_create(self.author_user, self.group)
+        index = reverse('posts:index')
+        first = self.guest.get(index)
+        second = self.guest.get(index, {'page': 2})
+        self.assertEqual(len(second.context['page_obj']), 1)
+        self.assertNotEqual(first.content, second.content)
+        cursor = first.context['page_obj'].next_cursor
+        by_cursor = self.guest.get(index, {'cursor': cursor})
+        self.assertIn(
+            f'/posts/{self.post.id}/', by_cursor.content.decode()
+        )
+
+    def test_post_cards_cached(self):
+        """
+        После появления нового поста страница собирается заново, но
+        карточки неизменённых постов берутся из кэша.
+        """
+        index = reverse('posts:index')
+        self.guest.get(index)
+        # update() не меняет post.updated: карточка остаётся прежней
+        Post.objects.filter(pk=self.post.pk).update(text='Изменённый текст')
+        new_post = post_create(self.author_user, self.group)
+        content = self.guest.get(index).content.decode()
+        self.assertIn(new_post.text, content)
+        self.assertIn(self.post.text, content)
+        self.assertNotIn('Изменённый текст', content)
+        updated = Post.objects.get(pk=self.post.pk).updated
+        author = User.objects.get(pk=self.author_user.pk)
+        author.first_name = 'Переименованный'
+        author.save()
+        content = self.guest.get(index).content.decode()
+        self.assertIn('Изменённый текст', content)
+        self.assertIn('Переименованный', content)
+        # переименование автора не трогает время правки его постов
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
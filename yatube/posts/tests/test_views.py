@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from django.contrib.auth import get_user_model
@@ -6,10 +7,13 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django import forms
+
+from core.storage import ContentAddressedStorage
 from posts.forms import PostForm
 from .factories import post_create, group_create, clean_counter
 
-from posts.models import Follow
+from posts.models import Comment, Follow, Post
+from posts.views import COMMENTS_LIMIT
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
@@ -35,6 +39,10 @@ class PostPagesTests(TestCase):
             content=cls.small_gif,
             content_type='image/gif'
         )
+        # картинка хранится под именем из хэша содержимого
+        cls.image_name = ContentAddressedStorage.hashed_name(
+            'posts/small.gif', hashlib.sha256(cls.small_gif).hexdigest()
+        )
         cls.group = group_create()
         cls.group_2 = group_create()
         cls.post = post_create(cls.author_user, cls.group, cls.uploaded)
@@ -79,7 +87,7 @@ class PostPagesTests(TestCase):
                 self.assertEqual(post.author.username, 'author')
                 self.assertEqual(post.text, 'post1')
                 self.assertEqual(post.group.title, 'Группа1')
-                self.assertEqual(post.image, 'posts/small.gif')
+                self.assertEqual(post.image, self.image_name)
 
     def test_post_detail_page_contains_post_group_author(self):
         """
@@ -93,7 +101,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(post.author.username, 'author')
         self.assertEqual(post.text, 'post1')
         self.assertEqual(post.group.title, 'Группа1')
-        self.assertEqual(post.image, 'posts/small.gif')
+        self.assertEqual(post.image, self.image_name)
 
     def create_post_contains_fields_required_type(self, response):
         """
@@ -202,7 +210,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(post.author.username, 'author')
         self.assertEqual(post.text, 'post1')
         self.assertEqual(post.group.title, 'Группа1')
-        self.assertEqual(post.image, 'posts/small.gif')
+        self.assertEqual(post.image, self.image_name)
 
 
 class PaginatorViewsTest(TestCase):
@@ -246,3 +254,102 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.author.get(reverse_name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """
+        Переходя по курсорам "Следующая" и "Предыдущая" на главной
+        странице, странице группы и странице профиля, посетитель увидит
+        все 13 постов по одному разу, в порядке публикации.
+        """
+        reverses_names = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author_user}),
+        ]
+        for reverse_name in reverses_names:
+            with self.subTest(reverse_name=reverse_name):
+                first_page = self.author.get(reverse_name).context['page_obj']
+                self.assertIsNone(first_page.previous_cursor)
+                response = self.author.get(
+                    reverse_name, {'cursor': first_page.next_cursor}
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertIsNone(second_page.next_cursor)
+                posts = list(first_page) + list(second_page)
+                self.assertEqual(
+                    posts,
+                    list(Post.objects.order_by('-pub_date', '-id'))
+                )
+                response = self.author.get(
+                    reverse_name, {'cursor': second_page.previous_cursor}
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first_page)
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Повреждённый курсор открывает первую страницу ленты."""
+        response = self.author.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author_user = User.objects.create_user('author')
+        cls.post = post_create(cls.author_user, None)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author_user, text=f'к{i}')
+            for i in range(COMMENTS_LIMIT + 5)
+        )
+        Post.objects.filter(pk=cls.post.pk).update(
+            comments_count=COMMENTS_LIMIT + 5
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        clean_counter()
+
+    def setUp(self):
+        self.guest = Client()
+
+    def test_comments_loaded_in_batches(self):
+        """
+        На странице поста выводится первая порция комментариев, а
+        остальные подгружаются по курсору фрагментом или в JSON.
+        """
+        expected = list(Comment.objects.order_by('-created', '-id'))
+        response = self.guest.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        first = response.context['comments']
+        self.assertEqual(list(first), expected[:COMMENTS_LIMIT])
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        self.assertContains(response, f'{url}?cursor={first.next_cursor}')
+        response = self.guest.get(url, {'cursor': first.next_cursor})
+        second = response.context['comments']
+        self.assertEqual(list(second), expected[COMMENTS_LIMIT:])
+        self.assertIsNone(second.next_cursor)
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        response = self.guest.get(
+            url, {'cursor': first.next_cursor, 'format': 'json'}
+        )
+        self.assertEqual(
+            [comment['id'] for comment in response.json()['comments']],
+            [comment.id for comment in expected[COMMENTS_LIMIT:]]
+        )
+        self.assertIsNone(response.json()['next_cursor'])
+
+    def test_comments_of_missing_post_not_found(self):
+        """Для несуществующего поста комментарии не отдаются."""
+        response = self.guest.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,30 @@
+"""
+Код, выполняемый в процессах пула миниатюр (см. `posts.thumbnails`).
+
+Модуль не импортирует модели при загрузке: процессы запускаются
+методом spawn, и Django настраивается в них только в `setup`.
+"""
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def generate(name, variants):
+    """
+    Построить миниатюры картинки `name` для всех вариантов. Возвращает
+    False, если построить удалось не все (например, файла нет).
+    """
+    from sorl.thumbnail import default, get_thumbnail
+    from sorl.thumbnail.images import ImageFile
+
+    from posts.models import Post
+
+    # картинка открывается из хранилища поля, как в шаблонах
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    ready = True
+    for geometry, options in variants:
+        thumbnail = get_thumbnail(source, geometry, **options)
+        ready = ready and default.kvstore.get(thumbnail) is not None
+    return ready
@@ -0,0 +1,465 @@
+"""
+Миниатюры картинок постов.
+
+Шаблоны выводят картинку поста в известных размерах (`VARIANTS`).
+sorl-thumbnail строит миниатюру при первом рендере, и её декодирование
+и масштабирование ложилось на запрос первого посетителя. Теперь после
+сохранения поста с новой картинкой миниатюры строятся в пуле процессов
+(`settings.THUMBNAIL_WORKERS`, 0 — прямо в запросе), а шаблон до их
+готовности показывает заглушку (тег `post_thumbnail`).
+
+Каждый вариант строится в нескольких ширинах (`SCALES`) в исходном
+формате миниатюр и в современных форматах (`settings.THUMBNAIL_FORMATS`:
+AVIF, WebP), а шаблон выводит их через `<picture>` и `srcset`, так что
+телефоны не скачивают картинку, рассчитанную на широкий экран. Сколько
+байт это экономит, показывает `manage.py report_image_savings`.
+
+Когда миниатюры готовы, у поста обновляется `updated` и версии
+фрагментов, чтобы закэшированные карточки с заглушкой перерисовались.
+
+Найденные миниатюры процесс помнит в памяти (`RECENT_SIZE`) вместе
+с версией картинки (пространство имён `image_namespace`). `forget`
+меняет версию удалённой картинки, и остальные процессы перестают
+брать её миниатюры из памяти после сверки кэша (см. `core.cache`).
+"""
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import fragments, pagecache
+
+from . import thumbnail_worker
+from .conditional import POSTS_NAMESPACE, post_namespace
+from .models import Post
+from .surrogates import post_key
+
+try:
+    # AVIF в Pillow добавляет плагин pillow-avif-plugin
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Размеры, в которых шаблоны выводят картинку поста
+VARIANTS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('672x237', {'crop': 'center', 'upscale': True}),
+}
+# Ширины картинки для srcset: доли ширины варианта
+SCALES = (0.5, 1)
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+
+# sorl-thumbnail не знает расширения для AVIF
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+# Миниатюра варианта: формат (None — исходный формат миниатюр), ширина
+# и параметры для get_thumbnail
+Rendition = namedtuple('Rendition', 'format width geometry options')
+Size = namedtuple('Size', 'width height')
+
+RECENT_SIZE = 1000  # сколько найденных миниатюр помнить в процессе
+
+_pool = None
+# ключ миниатюры -> (версия картинки, миниатюра), порядок LRU
+_recent = OrderedDict()
+_pending = set()  # картинки, миниатюры которых сейчас строятся
+_lock = threading.Lock()
+
+
+def _options(source, options):
+    # Те же параметры по умолчанию, что дополняет
+    # ThumbnailBackend.get_thumbnail: от них зависит имя миниатюры.
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', default.backend._get_format(source))
+    for key, value in default.backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in default.backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def formats():
+    """
+    Форматы из `settings.THUMBNAIL_FORMATS`, которые умеет сохранять
+    установленный Pillow, в порядке предпочтения.
+    """
+    Image.init()
+    return [
+        image_format for image_format in settings.THUMBNAIL_FORMATS
+        if image_format in MIME_TYPES and image_format in Image.SAVE
+    ]
+
+
+def variant_size(variant):
+    """
+    Размер картинки варианта. Миниатюры обрезаются и увеличиваются
+    до него (crop, upscale), поэтому он известен без файла.
+    """
+    geometry, _ = VARIANTS[variant]
+    return Size(*(int(side) for side in geometry.split('x')))
+
+
+def renditions(variant):
+    """Все миниатюры варианта: каждая ширина в каждом формате."""
+    _, options = VARIANTS[variant]
+    width, height = variant_size(variant)
+    result = []
+    for image_format in [None] + formats():
+        for scale in SCALES:
+            rendition_options = dict(options)
+            if image_format is not None:
+                rendition_options['format'] = image_format
+            result.append(Rendition(
+                image_format,
+                round(width * scale),
+                f'{round(width * scale)}x{round(height * scale)}',
+                rendition_options,
+            ))
+    return result
+
+
+def _all_renditions():
+    return [
+        rendition for variant in VARIANTS for rendition in renditions(variant)
+    ]
+
+
+class Picture:
+    """
+    Готовые миниатюры картинки в одном варианте. `url`, `width` и
+    `height` относятся к миниатюре полной ширины в исходном формате —
+    она выводится в `<img>`; `sources` — пары (MIME-тип, srcset) для
+    `<source>` в порядке предпочтения. `complete` ложно, если построены
+    не все миниатюры (например, картинка загружена до появления
+    форматов или ширин).
+    """
+
+    def __init__(self, variant, thumbnails):
+        self.size = variant_size(variant)
+        self.full_width = self.size.width
+        # (формат, ширина) -> миниатюра
+        self.thumbnails = thumbnails
+        self.fallback = thumbnails[(None, self.full_width)]
+        self.complete = len(thumbnails) == len(renditions(variant))
+
+    @property
+    def url(self):
+        return self.fallback.url
+
+    @property
+    def width(self):
+        return self.size.width
+
+    @property
+    def height(self):
+        return self.size.height
+
+    @property
+    def sizes(self):
+        return f'(max-width: {self.full_width}px) 100vw, {self.full_width}px'
+
+    def _srcset(self, image_format):
+        return ', '.join(
+            f'{thumbnail.url} {width}w'
+            for (rendition_format, width), thumbnail in sorted(
+                self.thumbnails.items(), key=lambda item: item[0][1]
+            )
+            if rendition_format == image_format
+        )
+
+    @property
+    def srcset(self):
+        return self._srcset(None)
+
+    @property
+    def sources(self):
+        present = {image_format for image_format, _ in self.thumbnails}
+        return [
+            (MIME_TYPES[image_format], self._srcset(image_format))
+            for image_format in formats() if image_format in present
+        ]
+
+
+def file_sizes(picture):
+    """
+    Размеры файлов миниатюр в байтах: (формат, ширина) -> байты.
+    Миниатюры, файлов которых уже нет, пропускаются.
+    """
+    sizes = {}
+    for spec, thumbnail in picture.thumbnails.items():
+        try:
+            sizes[spec] = thumbnail.storage.size(thumbnail.name)
+        except OSError:
+            pass
+    return sizes
+
+
+def _thumbnail_file(image, rendition):
+    # По имени картинка ищется в хранилище поля, как и у FieldFile:
+    # от хранилища зависит ключ миниатюры.
+    source = ImageFile(image, Post._meta.get_field('image').storage)
+    name = default.backend._get_thumbnail_filename(
+        source, rendition.geometry, _options(source, rendition.options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def image_namespace(name):
+    # миниатюры картинки: меняется, когда их файлы удаляются
+    return f'thumbnails:{name}'
+
+
+def _remember(key, version, thumbnail):
+    with _lock:
+        _recent[key] = (version, thumbnail)
+        _recent.move_to_end(key)
+        if len(_recent) > RECENT_SIZE:
+            _recent.popitem(last=False)
+
+
+def _recalled(key, version):
+    with _lock:
+        entry = _recent.get(key)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            # миниатюры удалены, возможно, другим процессом
+            del _recent[key]
+            return None
+        _recent.move_to_end(key)
+        return entry[1]
+
+
+def _stored(keys):
+    """
+    Записи хранилища sorl-thumbnail по ключам миниатюр за одно
+    обращение к кэшу и один запрос к базе вместо запроса на ключ.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        found = {key: kvstore._get(key) for key in keys}
+        return {key: value for key, value in found.items() if value}
+    raw_keys = {add_prefix(key): key for key in keys}
+    values = kvstore.cache.get_many(list(raw_keys))
+    missing = [raw for raw in raw_keys if raw not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        # как и sorl, запоминаем в кэше и отсутствие записи
+        read = {raw: stored.get(raw, EMPTY_VALUE) for raw in missing}
+        kvstore.cache.set_many(
+            read, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(read)
+    return {
+        raw_keys[raw]: deserialize_image_file(value)
+        for raw, value in values.items()
+        if value is not EMPTY_VALUE
+    }
+
+
+def _ready(versions):
+    # Готовые миниатюры по ключам (ключ -> версия картинки): сначала из
+    # памяти, затем из хранилища.
+    found = {}
+    for key, version in versions.items():
+        thumbnail = _recalled(key, version)
+        if thumbnail is not None:
+            found[key] = thumbnail
+    missing = [key for key in versions if key not in found]
+    if missing:
+        for key, thumbnail in _stored(missing).items():
+            _remember(key, versions[key], thumbnail)
+            found[key] = thumbnail
+    return found
+
+
+def ready_pictures(images, variant):
+    """
+    Готовые миниатюры для нескольких картинок: словарь «имя картинки —
+    `Picture`» только для тех, у которых построена миниатюра полной
+    ширины. Недавно найденные миниатюры берутся из памяти процесса,
+    остальные — одним обращением к хранилищу.
+    """
+    names = list(dict.fromkeys(image.name for image in images))
+    image_versions = dict(zip(
+        names, fragments.versions(*map(image_namespace, names))
+    ))
+    keys = {}
+    for image in images:
+        for rendition in renditions(variant):
+            keys[_thumbnail_file(image, rendition).key] = (
+                image.name, (rendition.format, rendition.width)
+            )
+    grouped = {}
+    for key, thumbnail in _ready({
+        key: image_versions[name] for key, (name, _) in keys.items()
+    }).items():
+        name, spec = keys[key]
+        grouped.setdefault(name, {})[spec] = thumbnail
+    pictures = {}
+    for name, thumbnails in grouped.items():
+        try:
+            pictures[name] = Picture(variant, thumbnails)
+        except KeyError:
+            # миниатюры полной ширины ещё нет
+            pass
+    return pictures
+
+
+def ready_picture(image, variant):
+    """Готовые миниатюры картинки или None, если их ещё нет."""
+    return ready_pictures([image], variant).get(image.name)
+
+
+def build_picture(image, variant):
+    """Построить все миниатюры варианта прямо сейчас."""
+    return Picture(variant, {
+        (rendition.format, rendition.width): get_thumbnail(
+            image, rendition.geometry, **rendition.options
+        )
+        for rendition in renditions(variant)
+    })
+
+
+def prefetch(posts, variant):
+    """
+    Найти миниатюры картинок для всех постов страницы разом; тег
+    `post_thumbnail` затем не обращается к хранилищу.
+    """
+    posts = [post for post in posts if post.image]
+    found = ready_pictures([post.image for post in posts], variant)
+    for post in posts:
+        if not hasattr(post, '_thumbnails'):
+            post._thumbnails = {}
+        post._thumbnails[variant] = found.get(post.image.name)
+
+
+def _forget_missing(name):
+    # Хранилище с кэшем запоминает и отсутствие миниатюры, а записал её
+    # другой процесс: сбрасываем кэш, чтобы она нашлась в базе.
+    cache = getattr(default.kvstore, 'cache', None)
+    if cache is not None:
+        cache.delete_many([
+            add_prefix(_thumbnail_file(name, rendition).key)
+            for rendition in _all_renditions()
+        ])
+
+
+def forget(name):
+    """
+    Забыть миниатюры удалённой картинки: в памяти этого процесса,
+    в кэше и, сменой версии картинки, в памяти остальных процессов.
+    """
+    with _lock:
+        for rendition in _all_renditions():
+            _recent.pop(_thumbnail_file(name, rendition).key, None)
+    fragments.bump(image_namespace(name))
+    _forget_missing(name)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=thumbnail_worker.setup,
+        )
+    return _pool
+
+
+def _mark_ready(post_id, name, ready):
+    if not ready:
+        # иначе карточка перерисовывалась бы и снова ставила задачу
+        return
+    _forget_missing(name)
+    Post.objects.filter(pk=post_id).update(updated=timezone.now())
+    fragments.bump(POSTS_NAMESPACE, post_namespace(post_id))
+    # ключ поста есть у всех страниц с его карточкой
+    pagecache.purge(post_key(post_id))
+
+
+def _finished(post_id, name, future):
+    # Вызывается в служебном потоке пула: соединение с базой у него своё.
+    with _lock:
+        _pending.discard(name)
+    try:
+        _mark_ready(post_id, name, future.result())
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', name)
+    finally:
+        close_old_connections()
+
+
+def _submit(post_id, name):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    variants = [
+        (rendition.geometry, rendition.options)
+        for rendition in _all_renditions()
+    ]
+    if not settings.THUMBNAIL_WORKERS:
+        try:
+            ready = thumbnail_worker.generate(name, variants)
+        finally:
+            with _lock:
+                _pending.discard(name)
+        _mark_ready(post_id, name, ready)
+        return
+    future = _get_pool().submit(thumbnail_worker.generate, name, variants)
+    future.add_done_callback(partial(_finished, post_id, name))
+
+
+def schedule(post):
+    """Построить миниатюры картинки поста после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(partial(_submit, post.pk, post.image.name))
+
+
+def post_thumbnail(post, variant):
+    """
+    Готовые миниатюры картинки поста (`Picture`). Если их нет,
+    построение ставится в очередь (например, для постов, созданных
+    до появления пула).
+    """
+    if not post.image:
+        return None
+    prefetched = getattr(post, '_thumbnails', {})
+    if variant in prefetched:
+        picture = prefetched[variant]
+    else:
+        picture = ready_picture(post.image, variant)
+    if picture is None or not picture.complete:
+        if not settings.THUMBNAIL_WORKERS:
+            # без пула миниатюры строятся прямо в запросе, как раньше
+            return build_picture(post.image, variant)
+        schedule(post)
+    return picture
@@ -1,57 +1,121 @@
+from urllib.parse import urlencode
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from .models import Post, Group, Follow
-from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
 from .forms import PostForm, CommentForm
+from .pagination import CursorPaginator, DeepPage
+from . import counters, feed, search
+from .surrogates import (
+    POSTS_KEY, author_key, author_posts_key, byline_key, byline_keys,
+    group_key, post_key, post_keys
+)
+from .conditional import (
+    POSTS_NAMESPACE, conditional_page, feed_namespaces, follow_namespace,
+    follow_namespaces, post_namespaces, profile_namespaces
+)
+from core import fragments, pagecache, querycache
 from django.contrib.auth.decorators import login_required
 
 User = get_user_model()
 SELECT_LIMIT = 10  # лимит количества записей на странице
+COMMENTS_LIMIT = 20  # сколько комментариев подгружать за раз
 
 
-def paginator(request, posts):
-    paginator = Paginator(posts, SELECT_LIMIT)
+def paginator(request, posts, count=None, keys=('pub_date', 'id')):
+    paginator = CursorPaginator(posts, SELECT_LIMIT, keys=keys, count=count)
+    # курсор имеет приоритет над номером страницы: выборка по ключу
+    # (pub_date, id) не зависит от глубины страницы
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    try:
+        return paginator.get_page(page_number)
+    except DeepPage:
+        raise Http404('Дальше страницы открываются по ссылке «Следующая»')
+
 
+def comments_page(post, cursor=None):
+    # Комментарии подгружаются порциями по ключу (created, id) от новых
+    # к старым; количество берётся из счётчика поста.
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_LIMIT,
+        keys=('created', 'id'),
+        count=lambda: post.comments_count,
+    )
+    if cursor:
+        return paginator.get_cursor_page(cursor)
+    return paginator.page(1)
 
+
+@conditional_page(feed_namespaces)
 def index(request):
     # Главная страница
-    post_list = Post.objects.select_related('author', 'group').all()
-    page_obj = paginator(request, post_list)
+    post_list = Post.objects.cached().select_related('author', 'group')
+    page_obj = paginator(request, post_list, counters.total_count)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'fragment_version': fragments.version(POSTS_NAMESPACE)
     }
-    return render(request, 'posts/index.html', context)
+    response = render(request, 'posts/index.html', context)
+    return pagecache.tag(
+        response, [POSTS_KEY, *post_keys(page_obj), *byline_keys(page_obj)]
+    )
 
 
+@conditional_page(feed_namespaces)
 def group_posts(request, slug):
     # Страница сообществ
-    group = get_object_or_404(Group, slug=slug)
-    group_list = group.posts.select_related('author', 'group').all()
-    page_obj = paginator(request, group_list)
+    group = get_object_or_404(Group.objects.cached(), slug=slug)
+    group_list = group.posts.cached().select_related('author', 'group')
+    page_obj = paginator(
+        request, group_list, lambda: counters.group_count(group.id)
+    )
     title = str(group)
     context = {
         'group': group,
         'page_obj': page_obj,
-        'title': title
+        'title': title,
+        'fragment_version': fragments.version(POSTS_NAMESPACE)
     }
     template = 'posts/group_list.html'
-    return render(request, template, context)
+    response = render(request, template, context)
+    return pagecache.tag(response, [
+        group_key(group.slug), *post_keys(page_obj), *byline_keys(page_obj)
+    ])
+
+
+@conditional_page(feed_namespaces)
+def post_search(request):
+    # Поиск по текстам постов
+    query = request.GET.get('q', '').strip()
+    page_obj = paginator(request, search.find(query), keys=search.KEYS)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
 
 
+@conditional_page(profile_namespaces)
 def profile(request, username):
     # Профиль пользователя
     is_profile = True
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        querycache.cached(User.objects.select_related('counter')),
+        username=username
+    )
     user = request.user
-    post_list = Post.objects.filter(author=author).select_related(
+    post_list = Post.objects.cached().filter(author=author).select_related(
         'group',
         'author',
     )
-    count = post_list.count()
-    page_obj = paginator(request, post_list)
+    count = counters.author_count(author.id)
+    page_obj = paginator(request, post_list, lambda: count)
     following = (
         author.following.filter(user_id=user.id)
     ).exists()
@@ -61,18 +125,24 @@ def profile(request, username):
         'count': count,
         'is_profile': is_profile,
         'following': following,
+        'fragment_version': fragments.version(POSTS_NAMESPACE)
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return pagecache.tag(response, [
+        author_key(author.id), byline_key(author.id), *post_keys(page_obj)
+    ])
 
 
+@conditional_page(post_namespaces)
 def post_detail(request, post_id):
     # Старица поста
     post = get_object_or_404(
-        Post.objects.select_related('author', 'group'),
+        Post.objects.cached().select_related('author', 'group'),
         pk=post_id
     )
-    count = post.author.posts.count()
-    comments = post.comments.select_related('author', 'post').all()
+    count = counters.author_count(post.author_id)
+    # без JavaScript ссылка «Показать ещё» открывает следующую порцию
+    comments = comments_page(post, request.GET.get('comments'))
     form = CommentForm()
     context = {
         'post': post,
@@ -80,7 +150,45 @@ def post_detail(request, post_id):
         'form': form,
         'comments': comments
     }
-    return render(request, 'posts/post_detail.html', context)
+    response = render(request, 'posts/post_detail.html', context)
+    keys = [
+        post_key(post.id),
+        byline_key(post.author_id),
+        author_posts_key(post.author_id),
+        *byline_keys(comments),
+    ]
+    if post.group is not None:
+        keys.append(group_key(post.group.slug))
+    return pagecache.tag(response, keys)
+
+
+@conditional_page(post_namespaces)
+def post_comments(request, post_id):
+    # Следующая порция комментариев: HTML-фрагмент или JSON
+    post = get_object_or_404(Post.objects.only('comments_count'), pk=post_id)
+    comments = comments_page(post, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        response = JsonResponse({
+            'comments': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    else:
+        context = {
+            'post': post,
+            'comments': comments
+        }
+        response = render(request, 'includes/comment_list.html', context)
+    return pagecache.tag(
+        response, [post_key(post.id), *byline_keys(comments)]
+    )
 
 
 @login_required
@@ -142,12 +250,18 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_page(follow_namespaces)
 def follow_index(request):
-    post_list = Post.objects.select_related('author', 'group').filter(
-        author__following__user=request.user)
-    page_obj = paginator(request, post_list)
+    page_obj = paginator(
+        request,
+        feed.feed_for(request.user),
+        lambda: counters.feed_count(request.user.id),
+    )
     context = {
         'page_obj': page_obj,
+        'fragment_version': fragments.version(
+            POSTS_NAMESPACE, follow_namespace(request.user.id)
+        ),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # страницы для анонимных посетителей отдаются до сессий и базы
+    'core.pagecache.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +77,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.fragments.fragments',
             ],
         },
     },
@@ -131,6 +135,10 @@ USE_TZ = True
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_URL = '/static/'
+# куда collectstatic собирает статику; её отдаёт core.static
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# имена с хэшем содержимого, манифест и сжатые копии .gz и .br
+STATICFILES_STORAGE = 'core.static.PrecompressedManifestStorage'
 
 # Login url and redirect
 LOGIN_URL = 'users:login'
@@ -149,10 +157,76 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # указываем директорию для хранения тестовых медиа
 TEST_DIR = os.path.join(BASE_DIR, 'media/temp')
-
-# подключаем кэш
+# кто отдаёт тело медиафайлов (см. core.media): None — сам Django через
+# wsgi.file_wrapper (os.sendfile под gunicorn), 'x-accel-redirect' — nginx,
+# 'x-sendfile' — apache с mod_xsendfile
+MEDIA_SENDFILE = None
+# внутренний location nginx, который смотрит в MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# загружаемые файлы пишутся во временный файл на диске, а не в память
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# наибольший размер загружаемой картинки поста, байты
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+# картинки с большим числом пикселей отклоняются до декодирования
+IMAGE_MAX_PIXELS = 50 * 10 ** 6
+# предел для форматов, которые декодируются только целиком (все, кроме
+# JPEG): при пересохранении такая картинка вся распаковывается в память
+IMAGE_MAX_DECODED_PIXELS = 16 * 10 ** 6
+# длинная сторона хранимой картинки поста, пиксели; большие уменьшаются
+IMAGE_MAX_SIDE = 2560
+
+# подключаем кэш: LRU в памяти процесса перед общим кэшем (см.
+# core.cache); изменения рассылаются всем процессам через общий кэш
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # файл SQLite, общий для всех процессов на машине; на нескольких
+    # машинах его заменяет memcached
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+    # фрагменты {% cache %}: пересчёт истёкшего фрагмента берёт на себя
+    # один запрос, остальные отдают прежний или ждут нового
+    'template_fragments': {
+        'BACKEND': 'core.cache.StampedeCache',
+        'LOCATION': 'default',
+    },
+}
+# у тестов (manage.py test и pytest) свой кэш в памяти процесса: их
+# cache.clear() не должен очищать кэш запущенного сайта
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHES['shared'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
-}
+
+# параметры запроса, которые читают кэшируемые страницы; остальные
+# (например, ?utm_source) не входят в ключ кэша страниц (см. core.pagecache)
+PAGE_CACHE_PARAMETERS = ['page', 'cursor', 'q', 'comments', 'format']
+
+# начиная с этого количества подписчиков посты автора не раскладываются
+# по лентам подписчиков, а подтягиваются при чтении ленты
+FEED_CELEBRITY_FOLLOWERS = 1000
+
+# сколько процессов строят миниатюры картинок постов в фоне;
+# 0 — строить их прямо в запросе
+THUMBNAIL_WORKERS = 2
+
+# форматы миниатюр для <picture> в порядке предпочтения; форматы, которые
+# установленный Pillow не умеет сохранять, пропускаются
+THUMBNAIL_FORMATS = ['AVIF', 'WEBP']
@@ -16,7 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core import media, static
 
 
 urlpatterns = [
@@ -25,11 +26,16 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path(
+        settings.MEDIA_URL.lstrip('/') + '<path:path>',
+        media.serve,
+        name='media'
+    ),
+    path(
+        settings.STATIC_URL.lstrip('/') + '<path:path>',
+        static.serve,
+        name='static'
+    ),
 ]
 handler404 = 'core.views.page_not_found'
 handler403 = settings.CSRF_FAILURE_VIEW
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )